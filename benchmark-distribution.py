@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Benchmark the interpreters of distribution archives.
+
+Runs a fixed set of benchmarks with each distribution and prints a table
+comparing them to the first. e.g.::
+
+    benchmark-distribution.py --output report.json \\
+        dist/cpython-3.13.5-x86_64-unknown-linux-gnu-lto-*.tar.zst \\
+        dist/cpython-3.13.5-x86_64-unknown-linux-gnu-pgo+lto-*.tar.zst
+
+Reports written by ``--output`` can be given in place of archives, to
+compare against earlier results.
+
+``--isa-check`` runs the crypto and compression benchmarks and compares
+distributions differing only in their x86-64 microarchitecture level,
+failing if a higher level is slower.
+"""
+
+import argparse
+import collections
+import re
+import sys
+
+from pythonbuild.benchmark import (
+    add_report_arguments,
+    collect_reports,
+    compare_summaries,
+    print_legend,
+    print_report_table,
+    summarize,
+    write_reports,
+)
+
+# Benchmarks as (kind, setup, statement) tuples. Setup raising ImportError
+# skips the benchmark, e.g. for modules missing in older Python versions.
+BENCHMARKS = {
+    "interp_fib": (
+        "micro",
+        "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n",
+        "fib(20)",
+    ),
+    "interp_loops": (
+        "micro",
+        "",
+        "total = 0\n"
+        "for i in range(20000):\n"
+        "    if i % 3:\n"
+        "        total += i * 2\n"
+        "    else:\n"
+        "        total -= i\n",
+    ),
+    "interp_objects": (
+        "micro",
+        "class Point:\n"
+        "    def __init__(self, x, y):\n"
+        "        self.x = x\n"
+        "        self.y = y\n"
+        "    def add(self, other):\n"
+        "        return Point(self.x + other.x, self.y + other.y)\n",
+        "p = Point(0, 0)\nfor i in range(5000):\n    p = p.add(Point(i, -i))\n",
+    ),
+    "json_dumps": (
+        "micro",
+        "import json\n"
+        "data = [{'id': i, 'name': 'item%d' % i, 'tags': ['a', 'b'], 'v': i / 3}"
+        " for i in range(2000)]\n",
+        "json.dumps(data)",
+    ),
+    "json_loads": (
+        "micro",
+        "import json\n"
+        "data = json.dumps([{'id': i, 'name': 'item%d' % i, 'tags': ['a', 'b'],"
+        " 'v': i / 3} for i in range(2000)])\n",
+        "json.loads(data)",
+    ),
+    "re": (
+        "micro",
+        "import re\n"
+        "pattern = re.compile(r'(\\w+)@(\\w+)\\.(com|org)')\n"
+        "text = ' '.join('user%d@example.com word%d' % (i, i) for i in range(500))\n",
+        "pattern.findall(text)\nre.sub(r'\\d+', '#', text)",
+    ),
+    "sqlite3": (
+        "micro",
+        "import sqlite3\n",
+        "db = sqlite3.connect(':memory:')\n"
+        "db.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, v REAL)')\n"
+        "db.executemany('INSERT INTO t (name, v) VALUES (?, ?)',"
+        " (('n%d' % i, i / 7) for i in range(2000)))\n"
+        "db.execute('SELECT name, SUM(v) FROM t GROUP BY id % 10').fetchall()\n"
+        "db.close()\n",
+    ),
+    "hashlib_sha256": (
+        "micro",
+        "import hashlib\ndata = b'x' * (1 << 20)\n",
+        "hashlib.sha256(data).digest()",
+    ),
+    "hashlib_blake2b": (
+        "micro",
+        "import hashlib\ndata = b'x' * (1 << 20)\n",
+        "hashlib.blake2b(data).digest()",
+    ),
+    "zlib": (
+        "micro",
+        "import zlib\ndata = b''.join(b'%d,%d;' % (i, i * i) for i in range(40000))\n",
+        "zlib.decompress(zlib.compress(data))",
+    ),
+    "lzma": (
+        "micro",
+        "import lzma\ndata = b''.join(b'%d,%d;' % (i, i * i) for i in range(10000))\n",
+        "lzma.decompress(lzma.compress(data))",
+    ),
+    "bz2": (
+        "micro",
+        "import bz2\ndata = b''.join(b'%d,%d;' % (i, i * i) for i in range(20000))\n",
+        "bz2.decompress(bz2.compress(data))",
+    ),
+    "zstd": (
+        "micro",
+        "from compression import zstd\n"
+        "data = b''.join(b'%d,%d;' % (i, i * i) for i in range(40000))\n",
+        "zstd.decompress(zstd.compress(data))",
+    ),
+    # Bulk TLS 1.2 transfer with AES-GCM between in-memory endpoints, using
+    # the certificate of the test suite.
+    "ssl_aes_gcm": (
+        "micro",
+        "import os, ssl, test\n"
+        "keycert = os.path.join(os.path.dirname(test.__file__), 'certdata',"
+        " 'keycert.pem')\n"
+        "if not os.path.exists(keycert):\n"
+        "    keycert = os.path.join(os.path.dirname(test.__file__), 'keycert.pem')\n"
+        "server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)\n"
+        "server_ctx.load_cert_chain(keycert)\n"
+        "client_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)\n"
+        "client_ctx.check_hostname = False\n"
+        "client_ctx.verify_mode = ssl.CERT_NONE\n"
+        "for ctx in (server_ctx, client_ctx):\n"
+        "    ctx.maximum_version = ssl.TLSVersion.TLSv1_2\n"
+        "    ctx.set_ciphers('ECDHE-RSA-AES256-GCM-SHA384')\n"
+        "c_in, c_out, s_in, s_out = (ssl.MemoryBIO() for _ in range(4))\n"
+        "client = client_ctx.wrap_bio(c_in, c_out)\n"
+        "server = server_ctx.wrap_bio(s_in, s_out, server_side=True)\n"
+        "for _ in range(10):\n"
+        "    for side in (client, server):\n"
+        "        try:\n"
+        "            side.do_handshake()\n"
+        "        except ssl.SSLWantReadError:\n"
+        "            pass\n"
+        "    s_in.write(c_out.read())\n"
+        "    c_in.write(s_out.read())\n"
+        "data = b'x' * 16384\n",
+        "for _ in range(64):\n"
+        "    client.write(data)\n"
+        "    s_in.write(c_out.read())\n"
+        "    while True:\n"
+        "        try:\n"
+        "            server.read(65536)\n"
+        "        except ssl.SSLWantReadError:\n"
+        "            break\n",
+    ),
+    "pickle": (
+        "micro",
+        "import pickle\n"
+        "data = [{'id': i, 'name': 'item%d' % i, 'values': list(range(10)),"
+        " 't': (i, str(i))} for i in range(2000)]\n",
+        "pickle.loads(pickle.dumps(data))",
+    ),
+    "asyncio": (
+        "micro",
+        "import asyncio\n"
+        "async def worker(q):\n"
+        "    while (item := await q.get()) is not None:\n"
+        "        await asyncio.sleep(0)\n"
+        "async def main():\n"
+        "    q = asyncio.Queue()\n"
+        "    tasks = [asyncio.create_task(worker(q)) for _ in range(50)]\n"
+        "    for i in range(2000):\n"
+        "        await q.put(i)\n"
+        "    for _ in tasks:\n"
+        "        await q.put(None)\n"
+        "    await asyncio.gather(*tasks)\n",
+        "asyncio.run(main())",
+    ),
+    "decimal": (
+        "micro",
+        "import decimal\n"
+        "def pi(prec):\n"
+        "    decimal.getcontext().prec = prec\n"
+        "    D = decimal.Decimal\n"
+        "    lasts, t, s, n, na, d, da = 0, D(3), 3, 1, 0, 0, 24\n"
+        "    while s != lasts:\n"
+        "        lasts = s\n"
+        "        n, na = n + na, na + 8\n"
+        "        d, da = d + da, da + 32\n"
+        "        t = (t * n) / d\n"
+        "        s += t\n"
+        "    return s\n",
+        "pi(500)",
+    ),
+    # Application style workloads mixing the interpreter and extensions.
+    "macro_log_report": (
+        "macro",
+        "import collections, json, re\n"
+        "lines = ['2024-01-%02d 10:%02d:00 host%d GET /api/item/%d %d %dms'"
+        " % (i % 28 + 1, i % 60, i % 7, i, 200 if i % 13 else 500, i % 300)"
+        " for i in range(5000)]\n"
+        "pattern = re.compile(r'(\\S+) (\\S+) (\\S+) (\\S+) (\\S+) (\\d+) (\\d+)ms')\n",
+        "counts = collections.Counter()\n"
+        "latency = collections.defaultdict(list)\n"
+        "for line in lines:\n"
+        "    m = pattern.match(line)\n"
+        "    counts[m.group(6)] += 1\n"
+        "    latency[m.group(3)].append(int(m.group(7)))\n"
+        "json.dumps({'counts': counts, 'p50': {h: sorted(v)[len(v) // 2]"
+        " for h, v in latency.items()}})\n",
+    ),
+    "macro_templates": (
+        "macro",
+        "import html, string\n"
+        "row = string.Template('<tr><td>$id</td><td>$name</td><td>$price</td></tr>')\n"
+        "items = [{'id': i, 'name': '<item %d>' % i, 'price': '%.2f' % (i * 1.1)}"
+        " for i in range(3000)]\n",
+        "'\\n'.join(row.substitute(id=i['id'], name=html.escape(i['name']),"
+        " price=i['price']) for i in items)",
+    ),
+}
+
+# Benchmarks of code paths with ISA specific implementations, in OpenSSL and
+# the compression libraries.
+ISA_BENCHMARKS = (
+    "hashlib_sha256",
+    "hashlib_blake2b",
+    "ssl_aes_gcm",
+    "zlib",
+    "lzma",
+    "bz2",
+    "zstd",
+)
+
+# Executed by the distribution's interpreter to time a benchmark. The
+# number of loops is calibrated by the first process, so every value takes
+# at least ``min_time`` seconds.
+RUNNER = """
+import json, sys, time
+
+spec = json.loads(sys.argv[1])
+ns = {}
+try:
+    exec(spec["setup"], ns)
+except ImportError as e:
+    print(json.dumps({"skipped": str(e)}))
+    sys.exit(0)
+
+code = compile(spec["stmt"], "<benchmark>", "exec")
+
+def run(loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        exec(code, ns)
+    return time.perf_counter() - start
+
+loops = spec["loops"]
+if not loops:
+    loops = 1
+    while run(loops) < spec["min_time"]:
+        loops *= 2
+
+for _ in range(spec["warmups"]):
+    run(loops)
+
+values = [run(loops) / loops for _ in range(spec["values"])]
+print(json.dumps({"loops": loops, "values": values}))
+"""
+
+
+def run_benchmark(dist, name, processes, values, warmups, min_time):
+    """Run a benchmark in several processes, collecting per loop timings."""
+    kind, setup, stmt = BENCHMARKS[name]
+
+    spec = {
+        "setup": setup,
+        "stmt": stmt,
+        "loops": 0,
+        "values": values,
+        "warmups": warmups,
+        "min_time": min_time,
+    }
+
+    samples = []
+    for _ in range(processes):
+        res = dist.run_json(RUNNER, spec)
+
+        if "skipped" in res:
+            return {"skipped": res["skipped"]}
+
+        spec["loops"] = res["loops"]
+        samples.extend(res["values"])
+
+    result = summarize(samples)
+    result["kind"] = kind
+    result["loops"] = spec["loops"]
+    result["values"] = samples
+
+    return result
+
+
+def benchmark_distribution(dist, names, args):
+    report = dist.describe()
+    report["name"] = dist.name
+    report["benchmarks"] = {}
+
+    for name in names:
+        print("%s: running %s" % (dist.name, name), file=sys.stderr)
+
+        try:
+            report["benchmarks"][name] = run_benchmark(
+                dist, name, args.processes, args.values, args.warmups, args.min_time
+            )
+        except Exception as e:
+            # e.g. a higher ISA level than the machine supports.
+            report["benchmarks"][name] = {"error": str(e)}
+
+    return report
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1.0), ("ms", 1e3), ("us", 1e6)):
+        if seconds * scale >= 1.0:
+            return "%.2f %s" % (seconds * scale, unit)
+
+    return "%.0f ns" % (seconds * 1e9)
+
+
+def format_result(base, result):
+    if "mean" not in result:
+        return "skipped" if "skipped" in result else "error"
+
+    if base is result:
+        return "%s ± %.1f%%" % (
+            format_time(result["mean"]),
+            result["ci95"] / result["mean"] * 100.0,
+        )
+
+    if "mean" not in base:
+        return format_time(result["mean"])
+
+    c = compare_summaries(base, result)
+
+    return "%s %+.1f%% ± %.1f%%%s" % (
+        format_time(result["mean"]),
+        c["change"],
+        c["ci95"],
+        "" if c["significant"] else " (n.s.)",
+    )
+
+
+def print_table(reports, names):
+    """Print a table comparing each distribution's results with the first."""
+    print_legend([report["name"] for report in reports])
+
+    rows = []
+
+    for name in names:
+        base = reports[0]["benchmarks"].get(name, {})
+        rows.append(
+            [name]
+            + [format_result(base, r["benchmarks"].get(name, {})) for r in reports]
+        )
+
+    print_report_table(["benchmark"], rows)
+
+    print()
+    print(
+        "Times are per loop. [1] shows the 95% confidence interval of its mean. "
+        "Others show the change relative to [1] with the 95% confidence "
+        "interval of the difference; n.s. marks changes that are not "
+        "significant."
+    )
+
+
+def isa_level(target_triple):
+    """Obtain the x86-64 microarchitecture level of a target triple."""
+    m = re.match(r"x86_64(?:_v(\d))?-", target_triple)
+
+    return int(m.group(1) or 1) if m else None
+
+
+def compare_isa_levels(reports, names, tolerance):
+    """Compare distributions differing only in their x86-64 ISA level.
+
+    Each level is compared with the next lower level benchmarked. Returns
+    the benchmarks slower at the higher level by more than ``tolerance``
+    percent.
+    """
+    groups = collections.defaultdict(list)
+
+    for report in reports:
+        level = isa_level(report["target_triple"])
+        if level is not None:
+            key = (
+                report["python_version"],
+                report["build_options"],
+                report["target_triple"].split("-", 1)[1],
+            )
+            groups[key].append((level, report))
+
+    regressions = []
+
+    for key, group in sorted(groups.items()):
+        group.sort(key=lambda x: x[0])
+
+        for (lower_level, lower), (level, higher) in zip(
+            group, group[1:], strict=False
+        ):
+            print("%s vs %s" % (higher["name"], lower["name"]))
+
+            for name in names:
+                a = lower["benchmarks"].get(name, {})
+                b = higher["benchmarks"].get(name, {})
+
+                if "mean" not in a or "mean" not in b:
+                    print("  %-16s not measured" % name)
+                    continue
+
+                c = compare_summaries(a, b)
+
+                # Throughput is the inverse of the time per loop.
+                print(
+                    "  %-16s throughput %+6.1f%%%s"
+                    % (
+                        name,
+                        (a["mean"] / b["mean"] - 1.0) * 100.0,
+                        "" if c["significant"] else " (n.s.)",
+                    )
+                )
+
+                if c["significant"] and c["change"] > tolerance:
+                    regressions.append(
+                        "%s: %s is %.1f%% slower at v%d than at v%d"
+                        % (key[0], name, c["change"], level, lower_level)
+                    )
+
+            print()
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_report_arguments(parser)
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=sorted(BENCHMARKS),
+        help="Benchmark to run (may be given multiple times; default: all)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=3,
+        help="Number of processes running each benchmark",
+    )
+    parser.add_argument(
+        "--values", type=int, default=5, help="Number of timings per process"
+    )
+    parser.add_argument(
+        "--warmups",
+        type=int,
+        default=1,
+        help="Number of untimed runs per process",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.1,
+        help="Minimum duration of each timing in seconds",
+    )
+    parser.add_argument(
+        "--isa-check",
+        action="store_true",
+        help="Run crypto and compression benchmarks and fail if a higher "
+        "x86-64 ISA level is slower than a lower one",
+    )
+    parser.add_argument(
+        "--isa-tolerance",
+        type=float,
+        default=10.0,
+        help="Percentage a higher ISA level may be slower by",
+    )
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        names = args.benchmark
+    elif args.isa_check:
+        names = list(ISA_BENCHMARKS)
+    else:
+        names = list(BENCHMARKS)
+
+    reports = collect_reports(
+        args.inputs, lambda dist: benchmark_distribution(dist, names, args)
+    )
+
+    if args.output:
+        write_reports(args.output, reports)
+
+    print_table(reports, names)
+
+    if args.isa_check:
+        print()
+        regressions = compare_isa_levels(reports, names, args.isa_tolerance)
+
+        for regression in regressions:
+            print("error: %s" % regression)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Measure the memory footprint of distribution archives' interpreters.
+
+Reports the RSS, USS and PSS of interpreter processes after startup and
+after importing heavy standard library modules, and the number of shared
+libraries they map. Requires Linux. e.g.::
+
+    benchmark-memory.py \\
+        dist/cpython-3.13.5-x86_64-unknown-linux-gnu-pgo+lto-*.tar.zst \\
+        dist/cpython-3.13.5-x86_64-unknown-linux-musl-lto-*.tar.zst
+"""
+
+import argparse
+import statistics
+import sys
+
+from pythonbuild.benchmark import (
+    add_report_arguments,
+    collect_reports,
+    print_legend,
+    print_report_table,
+    write_reports,
+)
+
+# Measured states of a process, as the modules imported to reach them.
+STAGES = {
+    "startup": [],
+    "asyncio": ["asyncio"],
+    "ssl": ["ssl"],
+    "tkinter": ["tkinter"],
+    "sqlite3": ["sqlite3"],
+    "decimal": ["decimal"],
+    "all": ["asyncio", "ssl", "tkinter", "sqlite3", "decimal"],
+}
+
+METRICS = ("rss", "uss", "pss", "shared_libraries")
+
+# Executed by the distribution's interpreter. json is imported by every
+# stage, so it is part of the baseline.
+RUNNER = """
+import json, os, sys
+
+spec = json.loads(sys.argv[1])
+for name in spec["modules"]:
+    __import__(name)
+
+def memory():
+    # smaps_rollup sums smaps, which older kernels lack.
+    path = "/proc/self/smaps_rollup"
+    if not os.path.exists(path):
+        path = "/proc/self/smaps"
+
+    values = {}
+    with open(path) as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                key = parts[0].rstrip(":")
+                values[key] = values.get(key, 0) + int(parts[1]) * 1024
+
+    return values
+
+values = memory()
+
+libraries = set()
+with open("/proc/self/maps") as fh:
+    for line in fh:
+        parts = line.split(None, 5)
+        if len(parts) == 6 and ".so" in os.path.basename(parts[5].strip()):
+            libraries.add(parts[5].strip())
+
+print(json.dumps({
+    "rss": values["Rss"],
+    "uss": values["Private_Clean"] + values["Private_Dirty"],
+    "pss": values["Pss"],
+    "shared_libraries": len(libraries),
+    "libraries": sorted(libraries),
+}))
+"""
+
+
+def measure_memory(dist, stages, runs):
+    report = dist.describe()
+    report["name"] = dist.name
+    report["libpython_link_mode"] = dist.info["libpython_link_mode"]
+    report["crt_features"] = dist.info["crt_features"]
+    report["stages"] = {}
+
+    for stage in stages:
+        print("%s: measuring %s" % (dist.name, stage), file=sys.stderr)
+
+        try:
+            results = [
+                dist.run_json(RUNNER, {"modules": STAGES[stage]}) for _ in range(runs)
+            ]
+        except Exception as e:
+            # e.g. tkinter missing.
+            report["stages"][stage] = {"error": str(e)}
+            continue
+
+        # Medians of the runs, in bytes.
+        result = {
+            metric: statistics.median(r[metric] for r in results) for metric in METRICS
+        }
+        result["libraries"] = results[0]["libraries"]
+        report["stages"][stage] = result
+
+    return report
+
+
+def format_value(metric, value):
+    if metric == "shared_libraries":
+        return "%d" % value
+
+    return "%.1f MiB" % (value / 1048576.0)
+
+
+def print_table(reports, stages):
+    """Print a table comparing each distribution's footprint with the first."""
+    print_legend(
+        [
+            "%s (libpython %s, %s)"
+            % (
+                report["name"],
+                report["libpython_link_mode"],
+                ", ".join(report["crt_features"]),
+            )
+            for report in reports
+        ]
+    )
+
+    rows = []
+
+    for stage in stages:
+        for metric in METRICS:
+            row = [stage, metric]
+            base = reports[0]["stages"].get(stage, {})
+
+            for report in reports:
+                result = report["stages"].get(stage, {})
+
+                if metric not in result:
+                    row.append("error" if "error" in result else "-")
+                elif report is reports[0] or not base.get(metric):
+                    row.append(format_value(metric, result[metric]))
+                else:
+                    row.append(
+                        "%s %+.1f%%"
+                        % (
+                            format_value(metric, result[metric]),
+                            (result[metric] / base[metric] - 1.0) * 100.0,
+                        )
+                    )
+
+            rows.append(row)
+
+    print_report_table(["stage", "metric"], rows)
+
+    print()
+    print(
+        "USS is memory private to the process and PSS additionally includes "
+        "its proportional share of memory shared with other processes. Both "
+        "determine how many processes fit on a machine. Values are medians "
+        "of separate processes."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_report_arguments(parser)
+    parser.add_argument(
+        "--stage",
+        action="append",
+        choices=list(STAGES),
+        help="Stage to measure (may be given multiple times; default: all)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of processes measured per stage",
+    )
+
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        print("memory footprints can only be measured on Linux")
+        return 1
+
+    stages = args.stage or list(STAGES)
+
+    reports = collect_reports(
+        args.inputs, lambda dist: measure_memory(dist, stages, args.runs)
+    )
+
+    if args.output:
+        write_reports(args.output, reports)
+
+    print_table(reports, stages)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Measure how workloads scale with threads in distribution archives.
+
+Each thread performs the same amount of work, so a speedup of N at N threads
+is perfect scaling. Free-threaded distributions fail the check if a gated
+workload scales worse than ``--min-efficiency`` or the GIL is enabled. e.g.::
+
+    benchmark-scaling.py \\
+        dist/cpython-3.14.0-x86_64-unknown-linux-gnu-pgo+lto-*.tar.zst \\
+        dist/cpython-3.14.0-x86_64-unknown-linux-gnu-freethreaded+pgo+lto-*.tar.zst
+"""
+
+import argparse
+import os
+import sys
+
+from pythonbuild.benchmark import add_report_arguments, collect_reports, write_reports
+
+# Workloads as (gated, iterations, setup) tuples. The setup defines
+# ``work(iterations)``, which each thread runs. Gated workloads must scale
+# in free-threaded builds.
+WORKLOADS = {
+    "cpu": (
+        True,
+        1000000,
+        "def work(n):\n"
+        "    total = 0\n"
+        "    for i in range(n):\n"
+        "        total += i * i % 7\n"
+        "    return total\n",
+    ),
+    "objects": (
+        True,
+        200000,
+        "def work(n):\n"
+        "    items = []\n"
+        "    for i in range(n):\n"
+        "        items.append({'id': i, 'name': str(i)})\n"
+        "        if len(items) > 1000:\n"
+        "            items = []\n",
+    ),
+    "dict_contention": (
+        False,
+        500000,
+        "shared = {}\n"
+        "def work(n):\n"
+        "    for i in range(n):\n"
+        "        shared[i % 1024] = i\n",
+    ),
+    "list_contention": (
+        False,
+        500000,
+        "shared = []\n"
+        "def work(n):\n"
+        "    for i in range(n):\n"
+        "        shared.append(i)\n"
+        "        shared.pop()\n",
+    ),
+    # These release the GIL, so they scale in all builds.
+    "hashlib": (
+        False,
+        100,
+        "import hashlib\n"
+        "data = b'x' * (1 << 20)\n"
+        "def work(n):\n"
+        "    for _ in range(n):\n"
+        "        hashlib.sha256(data).digest()\n",
+    ),
+    "zlib": (
+        False,
+        50,
+        "import zlib\n"
+        "data = b''.join(b'%d,%d;' % (i, i * i) for i in range(100000))\n"
+        "def work(n):\n"
+        "    for _ in range(n):\n"
+        "        zlib.compress(data)\n",
+    ),
+}
+
+# Executed by the distribution's interpreter. Reports the best of several
+# runs per thread count, and whether the GIL ended up enabled.
+RUNNER = """
+import json, sys, threading, time
+
+spec = json.loads(sys.argv[1])
+ns = {}
+exec(spec["setup"], ns)
+work = ns["work"]
+
+def run(threads):
+    barrier = threading.Barrier(threads + 1)
+
+    def target():
+        barrier.wait()
+        work(spec["iterations"])
+
+    workers = [threading.Thread(target=target) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+times = {}
+for threads in spec["threads"]:
+    times[threads] = min(run(threads) for _ in range(spec["repeat"]))
+
+is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+print(json.dumps({"gil_enabled": is_gil_enabled(), "times": times}))
+"""
+
+
+def thread_counts(max_threads):
+    """Obtain powers of 2 up to and including ``max_threads``."""
+    counts = [1]
+    while counts[-1] * 2 < max_threads:
+        counts.append(counts[-1] * 2)
+    if max_threads > 1:
+        counts.append(max_threads)
+
+    return counts
+
+
+def measure_scaling(dist, names, args):
+    report = dist.describe()
+    report["name"] = dist.name
+    report["freethreaded"] = "freethreaded" in dist.info["build_options"].split("+")
+    report["workloads"] = {}
+
+    for name in names:
+        print("%s: running %s" % (dist.name, name), file=sys.stderr)
+
+        _, iterations, setup = WORKLOADS[name]
+        res = dist.run_json(
+            RUNNER,
+            {
+                "setup": setup,
+                "iterations": iterations,
+                "threads": thread_counts(args.threads),
+                "repeat": args.repeat,
+            },
+        )
+
+        # Speedup over 1 thread doing the same work per thread.
+        t1 = res["times"]["1"]
+        report["workloads"][name] = {
+            "gil_enabled": res["gil_enabled"],
+            "seconds": res["times"],
+            "speedup": {n: int(n) * t1 / t for n, t in res["times"].items()},
+        }
+
+    return report
+
+
+def scaling_failures(report, min_efficiency):
+    """Obtain why a free-threaded distribution fails to scale."""
+    if not report["freethreaded"]:
+        return []
+
+    failures = []
+
+    for name, result in report["workloads"].items():
+        if result["gil_enabled"]:
+            failures.append("%s: GIL enabled in free-threaded build" % name)
+
+        threads = max(result["speedup"], key=int)
+        speedup = result["speedup"][threads]
+
+        if WORKLOADS[name][0] and speedup < min_efficiency * int(threads):
+            failures.append(
+                "%s: speedup %.2f at %s threads below floor of %.2f"
+                % (name, speedup, threads, min_efficiency * int(threads))
+            )
+
+    return failures
+
+
+def print_report(report):
+    print(
+        "%s (%s)"
+        % (report["name"], "free-threaded" if report["freethreaded"] else "GIL")
+    )
+
+    threads = None
+
+    for name, result in report["workloads"].items():
+        if threads is None:
+            threads = list(result["speedup"])
+            print(
+                "  %-16s %s"
+                % ("speedup", " ".join("%7s" % ("%st" % n) for n in threads))
+            )
+
+        print(
+            "  %-16s %s%s"
+            % (
+                name,
+                " ".join("%7.2f" % result["speedup"][n] for n in threads),
+                "  (GIL enabled)"
+                if result["gil_enabled"] and report["freethreaded"]
+                else "",
+            )
+        )
+
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_report_arguments(parser)
+    parser.add_argument(
+        "--workload",
+        action="append",
+        choices=sorted(WORKLOADS),
+        help="Workload to run (may be given multiple times; default: all)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=min(os.cpu_count() or 1, 8),
+        help="Maximum number of threads (default: CPU count, up to 8)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of runs per thread count; the fastest is used",
+    )
+    parser.add_argument(
+        "--min-efficiency",
+        type=float,
+        default=0.5,
+        help="Minimum speedup per thread of gated workloads at the maximum "
+        "thread count in free-threaded builds",
+    )
+
+    args = parser.parse_args()
+
+    names = args.workload or list(WORKLOADS)
+
+    reports = collect_reports(
+        args.inputs, lambda dist: measure_scaling(dist, names, args)
+    )
+
+    if args.output:
+        write_reports(args.output, reports)
+
+    failures = []
+
+    for report in reports:
+        print_report(report)
+
+        failures.extend(
+            "%s: %s" % (report["name"], f)
+            for f in scaling_failures(report, args.min_efficiency)
+        )
+
+    for failure in failures:
+        print("error: %s" % failure)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
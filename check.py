@@ -10,6 +10,7 @@ import os
 import pathlib
 import subprocess
 import sys
+import tempfile
 import venv
 
 ROOT = pathlib.Path(os.path.abspath(__file__)).parent
@@ -18,6 +19,10 @@ PIP = VENV / "bin" / "pip"
 PYTHON = VENV / "bin" / "python"
 REQUIREMENTS = ROOT / "requirements.dev.txt"
 
+# Modules too expensive to import in build.py actions run on every make
+# invocation.
+STARTUP_FORBIDDEN_MODULES = {"docker", "jsonschema", "yaml", "zstandard"}
+
 
 def bootstrap():
     venv.create(VENV, with_pip=True)
@@ -42,6 +47,75 @@ def run_command(command: list[str]) -> int:
     return returncode
 
 
+def check_build_startup() -> int:
+    """Check the startup cost of build.py actions run on every make invocation.
+
+    Importing a forbidden module fails the check. Import times are only
+    reported, as they vary too much between machines.
+    """
+    from pythonbuild.utils import current_host_platform, default_target_triple
+
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as td:
+        # build.py and pythonbuild write to the build directory next to them.
+        # Running them through symlinks makes that a temporary directory.
+        for name in ("cpython-unix", "pythonbuild"):
+            os.symlink(ROOT / name, os.path.join(td, name))
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = td
+        env["PYTHONPYCACHEPREFIX"] = os.path.join(td, "pycache")
+
+        for action in ("makefiles", "dockerfiles"):
+            command = [
+                sys.executable,
+                "-X",
+                "importtime",
+                os.path.join(td, "cpython-unix", "build.py"),
+                "--host-platform",
+                current_host_platform(),
+                "--target-triple",
+                default_target_triple(),
+                "--python-source",
+                "null",
+                "--dest-archive",
+                "placeholder_archive",
+                action,
+            ]
+            print("$ " + " ".join(command))
+
+            # The first run populates caches (bytecode, compiled targets.yml).
+            for _ in range(2):
+                res = subprocess.run(command, capture_output=True, text=True, env=env)
+                if res.returncode:
+                    print(res.stdout + res.stderr)
+                    return 1
+
+            total = 0
+            imported = set()
+
+            # Lines look like `import time: <self us> | <cumulative us> | <name>`,
+            # with names indented by nesting level.
+            for line in res.stderr.splitlines():
+                if not line.startswith("import time:") or "cumulative" in line:
+                    continue
+
+                _, cumulative, name = line[len("import time:") :].split("|")
+                imported.add(name.strip())
+                if not name[1:].startswith(" "):
+                    total += int(cumulative)
+
+            print("imports took %.1fms" % (total / 1000))
+
+            for name in sorted(imported & STARTUP_FORBIDDEN_MODULES):
+                print("error: %s imported %s" % (action, name))
+                failures += 1
+
+    print()
+    return failures
+
+
 def run():
     env = dict(os.environ)
     env["PYTHONUNBUFFERED"] = "1"
@@ -66,8 +140,9 @@ def run():
     check_result = run_command(["ruff", "check"] + check_args)
     format_result = run_command(["ruff", "format"] + format_args)
     mypy_result = run_command(["mypy"] + mypy_args)
+    startup_result = check_build_startup() if sys.platform != "win32" else 0
 
-    if check_result + format_result + mypy_result:
+    if check_result + format_result + mypy_result + startup_result:
         print("Checks failed!")
         sys.exit(1)
     else:
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Compare the PGO profiles and interpreters produced by two training modes.
+
+Arguments are directories in ``build/pgo-training``, which builds run with
+``--pgo-jobs`` populate. e.g.::
+
+    compare-pgo-training.py \\
+        build/pgo-training/cpython-3.13.5-x86_64-unknown-linux-gnu-pgo.j1 \\
+        build/pgo-training/cpython-3.13.5-x86_64-unknown-linux-gnu-pgo.j32
+"""
+
+import argparse
+import json
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+# A mix of pure Python workloads exercising the interpreter loop, calls,
+# containers, strings and commonly used C extensions.
+BENCHMARK = """
+import json, re
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+fib(25)
+
+d = {}
+for i in range(200000):
+    d[str(i)] = i * 2
+sum(v for k, v in d.items() if k.endswith("7"))
+
+data = [{"id": i, "name": "item%d" % i, "tags": ["a", "b"]} for i in range(20000)]
+json.loads(json.dumps(data))
+
+pattern = re.compile(r"(\\w+)@(\\w+)\\.com")
+for i in range(50000):
+    pattern.match("user%d@example.com" % i)
+
+sorted(str(i) for i in range(200000))
+"""
+
+
+def load_training(path: pathlib.Path):
+    with (path / "pgo-profile" / "training.json").open("rb") as fh:
+        return json.load(fh)
+
+
+def profile_overlap(base: pathlib.Path, test: pathlib.Path):
+    """Obtain the edge profile overlap of two profiles, in percent."""
+    llvm_profdata = shutil.which("llvm-profdata")
+    if not llvm_profdata:
+        return None
+
+    res = subprocess.run(
+        [
+            llvm_profdata,
+            "overlap",
+            str(base / "pgo-profile" / "code.profclangd"),
+            str(test / "pgo-profile" / "code.profclangd"),
+        ],
+        capture_output=True,
+        text=True,
+    )
+
+    m = re.search(r"Edge profile overlap: ([\d.]+)%", res.stdout)
+    return float(m.group(1)) if m else None
+
+
+def benchmark(path: pathlib.Path, td: pathlib.Path, runs: int):
+    """Time the benchmark workload with a training directory's interpreter."""
+    with tarfile.open(path / "python.tar") as tf:
+        tf.extractall(td)
+
+    with (td / "python" / "PYTHON.json").open("rb") as fh:
+        info = json.load(fh)
+
+    python_exe = td / "python" / info["python_exe"]
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([str(python_exe), "-c", BENCHMARK], check=True)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline", help="Training directory of the baseline mode")
+    parser.add_argument("candidate", help="Training directory to compare")
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Number of runs of the benchmark"
+    )
+
+    args = parser.parse_args()
+
+    baseline = pathlib.Path(args.baseline)
+    candidate = pathlib.Path(args.candidate)
+
+    a = load_training(baseline)
+    b = load_training(candidate)
+
+    with tempfile.TemporaryDirectory() as td:
+        a["benchmark_seconds"] = benchmark(baseline, pathlib.Path(td) / "a", args.runs)
+        b["benchmark_seconds"] = benchmark(candidate, pathlib.Path(td) / "b", args.runs)
+
+    for d in (a, b):
+        d["coverage"] = 100.0 * d["covered_functions"] / max(d["functions"], 1)
+
+    print("%-24s %14s %14s %9s" % ("", "baseline", "candidate", "change"))
+    print("%-24s %14d %14d" % ("jobs", a["jobs"], b["jobs"]))
+
+    for key, fmt in (
+        ("make_seconds", "%d"),
+        ("functions", "%d"),
+        ("covered_functions", "%d"),
+        ("coverage", "%.2f%%"),
+        ("benchmark_seconds", "%.3f"),
+    ):
+        change = (b[key] - a[key]) / a[key] * 100.0 if a[key] else 0.0
+        print("%-24s %14s %14s %+8.1f%%" % (key, fmt % a[key], fmt % b[key], change))
+
+    overlap = profile_overlap(baseline, candidate)
+    if overlap is not None:
+        print("%-24s %14s" % ("edge profile overlap", "%.2f%%" % overlap))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
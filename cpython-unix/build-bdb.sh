@@ -34,5 +34,5 @@ CFLAGS="${CFLAGS}" CPPFLAGS="${CFLAGS}" ../dist/configure \
     --prefix=/tools/deps \
     ${CONFIGURE_FLAGS}
 
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS}
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out
@@ -19,7 +19,7 @@ tar -xf bzip2-${BZIP2_VERSION}.tar.gz
 
 pushd bzip2-${BZIP2_VERSION}
 
-make -j ${NUM_CPUS} install \
+make ${MAKE_JOBS_FLAGS} install \
     AR=${AR} \
     CC="${CC}" \
     CFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" \
@@ -97,7 +97,7 @@ CC="${HOST_CC}" CXX="${HOST_CXX}" CFLAGS="${EXTRA_HOST_CFLAGS}" CPPFLAGS="${EXTR
 # Ideally we'd do `make install` here and be done with it. But there's a race
 # condition in CPython's build system related to directory creation that gets
 # tickled when we do this. https://github.com/python/cpython/issues/109796.
-make -j "${NUM_CPUS}"
+make ${MAKE_JOBS_FLAGS}
 make -j sharedinstall DESTDIR=${ROOT}/out
 make -j install DESTDIR=${ROOT}/out
 
@@ -46,13 +46,28 @@ sed "${sed_args[@]}" "s|/tools/host|${TOOLS_PATH}/host|g" ${TOOLS_PATH}/host/sha
 # and it gets the job done.
 find ${TOOLS_PATH}/deps -name '*.so*' -a \! \( -name 'libtcl*.so*' -or -name 'libtk*.so*' \) -exec rm {} \;
 
-tar -xf Python-${PYTHON_VERSION}.tar.xz
+# Source trees synced from a checkout are mounted in place of the archive.
+if [ -z "${CPYTHON_SOURCE_TREE}" ]; then
+    tar -xf Python-${PYTHON_VERSION}.tar.xz
+fi
 
 PIP_WHEEL="${ROOT}/pip-${PIP_VERSION}-py3-none-any.whl"
 SETUPTOOLS_WHEEL="${ROOT}/setuptools-${SETUPTOOLS_VERSION}-py3-none-any.whl"
 
+# Incremental builds continue a previous build of the same configuration in
+# a source tree that was already patched and configured.
+if [ -n "${CPYTHON_INCREMENTAL}" ]; then
+    patch() {
+        echo "incremental build; not applying patch $*"
+    }
+fi
+
 cat Setup.local
-mv Setup.local Python-${PYTHON_VERSION}/Modules/Setup.local
+# The Setup.local is unchanged in incremental builds. Replacing it would
+# regenerate the Makefile, dropping our additions to it.
+if [ -z "${CPYTHON_INCREMENTAL}" ]; then
+    mv Setup.local Python-${PYTHON_VERSION}/Modules/Setup.local
+fi
 
 cat Makefile.extra
 
@@ -602,6 +617,31 @@ if [[ -n "${PYTHON_MEETS_MINIMUM_VERSION_3_14}" && -n "${CROSS_COMPILING}" && "$
     export PROFILE_TASK='-m test --pgo --ignore test_strftime_y2k'
 fi
 
+# Run the PGO (and BOLT) training workload in parallel worker processes. Each
+# worker writes its own raw profile (LLVM_PROFILE_FILE and BOLT's
+# -instrumentation-file-append-pid include the PID), which are merged once
+# the workload finishes.
+#
+# configure's default task, which keeps a timeout on hung tests. make expands
+# $(TESTTIMEOUT).
+DEFAULT_PROFILE_TASK='-m test --pgo --timeout=$(TESTTIMEOUT)'
+
+if [[ -n "${CPYTHON_PGO_JOBS}" && "${CPYTHON_PGO_JOBS}" -gt 1 ]]; then
+    export PROFILE_TASK="${PROFILE_TASK:-${DEFAULT_PROFILE_TASK}} -j ${CPYTHON_PGO_JOBS}"
+fi
+
+# Train with a custom workload, in addition to or instead of regrtest.
+if [ -n "${CPYTHON_PGO_WORKLOAD}" ]; then
+    tar -C ${ROOT} -xf ${ROOT}/pgo-workload.tar
+
+    PGO_WORKLOAD_TASK="${ROOT}/run_pgo_workload.py --jobs ${CPYTHON_PGO_JOBS:-1} ${ROOT}/pgo-workload"
+    if [ "${CPYTHON_PGO_WORKLOAD_MODE}" = "replace" ]; then
+        export PROFILE_TASK="${PGO_WORKLOAD_TASK}"
+    else
+        export PROFILE_TASK="${PGO_WORKLOAD_TASK} ${PROFILE_TASK:-${DEFAULT_PROFILE_TASK}}"
+    fi
+fi
+
 # ./configure tries to auto-detect whether it can build 128-bit and 256-bit SIMD helpers for HACL,
 # but on x86-64 that requires v2 and v3 respectively, and on arm64 the performance is bad as noted
 # in the comments, so just don't even try. (We should check if we can make this conditional)
@@ -650,30 +690,104 @@ if [ -n "${CROSS_COMPILING}" ]; then
     # TODO: There are probably more of these, see #399.
 fi
 
-# We patched configure.ac above. Reflect those changes.
-autoconf
+if [ -z "${CPYTHON_INCREMENTAL}" ]; then
+    # We patched configure.ac above. Reflect those changes.
+    autoconf
+
+    # Ensure `CFLAGS` are propagated to JIT compilation for 3.13+ (note this variable has no effect on
+    # 3.12 and earlier)
+    CFLAGS_JIT="${CFLAGS}"
+
+    # In 3.14+, the JIT compiler on x86-64 Linux uses a model that conflicts with `-fPIC`, so strip it
+    # from the flags. See:
+    # - https://github.com/python/cpython/issues/135690
+    # - https://github.com/python/cpython/pull/130097
+    if [[ -n "${PYTHON_MEETS_MINIMUM_VERSION_3_14}" && "${TARGET_TRIPLE}" == x86_64* ]]; then
+        CFLAGS_JIT="${CFLAGS_JIT//-fPIC/}"
+    fi
 
-# Ensure `CFLAGS` are propagated to JIT compilation for 3.13+ (note this variable has no effect on
-# 3.12 and earlier)
-CFLAGS_JIT="${CFLAGS}"
+    CFLAGS=$CFLAGS CPPFLAGS=$CFLAGS CFLAGS_JIT=$CFLAGS_JIT LDFLAGS=$LDFLAGS \
+        ./configure ${CONFIGURE_FLAGS}
 
-# In 3.14+, the JIT compiler on x86-64 Linux uses a model that conflicts with `-fPIC`, so strip it
-# from the flags. See:
-# - https://github.com/python/cpython/issues/135690
-# - https://github.com/python/cpython/pull/130097
-if [[ -n "${PYTHON_MEETS_MINIMUM_VERSION_3_14}" && "${TARGET_TRIPLE}" == x86_64* ]]; then
-    CFLAGS_JIT="${CFLAGS_JIT//-fPIC/}"
+    # Supplement produced Makefile with our modifications.
+    cat ../Makefile.extra >> Makefile
 fi
 
-CFLAGS=$CFLAGS CPPFLAGS=$CFLAGS CFLAGS_JIT=$CFLAGS_JIT LDFLAGS=$LDFLAGS \
-    ./configure ${CONFIGURE_FLAGS}
+PGO_MAKE_START=$(date +%s)
+
+# Reuse PGO and BOLT profile data from a previous build of the same source,
+# target, options and toolchain instead of running the instrumented training
+# workload. If the compiler or BOLT reports the profile as stale, discard it
+# and train a new one.
+#
+# Incremental builds keep using the profile data of the build they continue.
+if [ -n "${CPYTHON_INCREMENTAL}" ]; then
+    make ${MAKE_JOBS_FLAGS}
+elif [[ -n "${CPYTHON_OPTIMIZED}" && -n "${CPYTHON_CACHED_PROFILE}" ]]; then
+    cp Makefile Makefile.uncached
+
+    tar -xf ${ROOT}/pgo-profile.tar
+    cp pgo-profile/code.profclangd code.profclangd
+    touch profile-run-stamp
+
+    # Apply BOLT with the cached data rather than instrumenting the binaries.
+    if ls pgo-profile/*.fdata > /dev/null 2>&1; then
+        cat >> Makefile << 'EOF'
+
+profile-bolt-stamp: $(BUILDPYTHON)
+	for bin in $(BOLT_BINARIES); do \
+	  if [ -e "$${bin}.prebolt" ]; then mv "$${bin}.prebolt" "$${bin}"; fi; \
+	  if [ -e "pgo-profile/$${bin}.fdata" ]; then \
+	    cp "$${bin}" "$${bin}.prebolt"; \
+	    $(LLVM_BOLT) "$${bin}.prebolt" -o "$${bin}.bolt" -data="pgo-profile/$${bin}.fdata" $(BOLT_APPLY_FLAGS); \
+	    mv "$${bin}.bolt" "$${bin}"; \
+	  fi; \
+	done
+	touch $@
+EOF
+    fi
+
+    set -o pipefail
+    make ${MAKE_JOBS_FLAGS} 2>&1 | tee ${ROOT}/make-cached-profile.log
+    set +o pipefail
 
-# Supplement produced Makefile with our modifications.
-cat ../Makefile.extra >> Makefile
+    if grep -q -e "profile data may be out of date" -e "(possibly stale) profile" ${ROOT}/make-cached-profile.log; then
+        echo "cached PGO profile is stale; training a new one"
+        mv Makefile.uncached Makefile
+        make clean
+        rm -f profile-run-stamp code.profclangd
+        CPYTHON_CACHED_PROFILE=
 
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} sharedinstall DESTDIR=${ROOT}/out/python
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out/python
+        make ${MAKE_JOBS_FLAGS}
+    fi
+else
+    make ${MAKE_JOBS_FLAGS}
+fi
+
+# Export newly trained profile data so later builds can reuse it, along with
+# statistics about the training run. The directory always exists, so the
+# build can tell no profile was trained.
+mkdir -p ${ROOT}/out/pgo-profile
+
+if [[ -n "${CPYTHON_OPTIMIZED}" && -z "${CPYTHON_CACHED_PROFILE}" && -z "${CPYTHON_SOURCE_TREE}" && -f code.profclangd ]]; then
+    cp code.profclangd ${ROOT}/out/pgo-profile/
+    for f in *.fdata; do
+        if [ -f "${f}" ]; then
+            cp "${f}" ${ROOT}/out/pgo-profile/
+        fi
+    done
+
+    cat > ${ROOT}/out/pgo-profile/training.json << EOF
+{
+    "jobs": ${CPYTHON_PGO_JOBS:-1},
+    "make_seconds": $(( $(date +%s) - PGO_MAKE_START )),
+    "functions": $(${LLVM_PROFDATA} show code.profclangd | sed -n 's/^Total functions: //p'),
+    "covered_functions": $(${LLVM_PROFDATA} show --covered code.profclangd | wc -l)
+}
+EOF
+fi
+make ${MAKE_JOBS_FLAGS} sharedinstall DESTDIR=${ROOT}/out/python
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out/python
 
 
 if [ -n "${CPYTHON_FREETHREADED}" ]; then
@@ -1231,6 +1345,156 @@ EOF
 
 ${BUILD_PYTHON} ${ROOT}/fix_shebangs.py ${ROOT}/out/python/install
 
+# Bytecode removed above can optionally be shipped for the standard library,
+# for all optimization levels, so imports don't compile modules on first use
+# or, in read-only installs, in every process. Unchecked hash based pycs don't
+# depend on source mtimes and are never revalidated, so they are compiled only
+# once shebangs are fixed: that rewrites stdlib scripts like cgi.py. A fixed
+# hash seed keeps the order of set constants, and thus the pycs,
+# deterministic.
+#
+# Packages in site-packages (pip) aren't ours to compile: their pycs aren't in
+# their RECORD, so upgrading them would leave stale pycs behind. As in
+# CPython's install, files failing to compile (e.g. test data) don't fail the
+# build.
+if [ -n "${CPYTHON_PRECOMPILE_BYTECODE}" ]; then
+    if ! PYTHONHASHSEED=0 ${BUILD_PYTHON} -Wi -m compileall -q -j 0 \
+        --invalidation-mode unchecked-hash -o 0 -o 1 -o 2 \
+        -s ${ROOT}/out/python/install -p /install \
+        -x 'bad_coding|badsyntax|site-packages|lib2to3/tests/data|test_lib2to3/data' \
+        ${ROOT}/out/python/install/lib/python${PYTHON_MAJMIN_VERSION}${PYTHON_LIB_SUFFIX}; then
+        echo "warning: some standard library files could not be compiled"
+    fi
+fi
+
+# Optionally move the pure Python standard library into the pythonXY.zip
+# that is on sys.path by default, so imports don't stat and open thousands of
+# small files. zipimport can't write bytecode, so the zip also holds
+# unchecked hash based pycs, in the legacy location zipimport reads them from.
+if [ -n "${CPYTHON_STDLIB_ZIP}" ]; then
+    cat > ${ROOT}/zip_stdlib.py << EOF
+import json
+import os
+import py_compile
+import sys
+import tempfile
+import zipfile
+
+STDLIB, ZIP, METADATA = sys.argv[1:]
+
+# Entries kept as files. os.py is the landmark Python locates its prefix by,
+# and tools patch _sysconfigdata in place. It is also zipped.
+KEEP = {"__pycache__", "lib-dynload", "site-packages"}
+
+
+def is_data_file(name):
+    # Documentation isn't read at run time.
+    return not name.endswith((".py", ".rst")) and not name.startswith("README")
+
+
+def is_pure_python(path):
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        if any(is_data_file(f) for f in files):
+            return False
+
+    return True
+
+
+def add_file(zf, name, data):
+    # Fixed metadata keeps the zip deterministic.
+    zi = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    zi.external_attr = 0o644 << 16
+    zf.writestr(zi, data, compress_type=zipfile.ZIP_STORED)
+
+
+zipped = []
+
+for name in sorted(os.listdir(STDLIB)):
+    path = os.path.join(STDLIB, name)
+
+    if name in KEEP or name.startswith(("config-", "_sysconfigdata")):
+        continue
+
+    if os.path.isdir(path):
+        # Packages with data files may read them relative to __file__.
+        if is_pure_python(path):
+            zipped.append(name)
+    elif name.endswith(".py"):
+        zipped.append(name)
+
+with zipfile.ZipFile(ZIP, "w") as zf, tempfile.TemporaryDirectory() as td:
+    for top in zipped:
+        if top.endswith(".py"):
+            sources = [top]
+        else:
+            sources = []
+            for root, dirs, files in os.walk(os.path.join(STDLIB, top)):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                rel = os.path.relpath(root, STDLIB)
+                sources.extend(
+                    os.path.join(rel, f) for f in sorted(files) if f.endswith(".py")
+                )
+
+        for source in sources:
+            name = source.replace(os.sep, "/")
+
+            with open(os.path.join(STDLIB, source), "rb") as fh:
+                add_file(zf, name, fh.read())
+
+            cfile = os.path.join(td, "module.pyc")
+            try:
+                py_compile.compile(
+                    os.path.join(STDLIB, source),
+                    cfile=cfile,
+                    dfile="/install/lib/%s/%s" % (os.path.basename(ZIP), name),
+                    doraise=True,
+                    invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+                )
+            except py_compile.PyCompileError:
+                continue
+
+            with open(cfile, "rb") as fh:
+                add_file(zf, name[:-3] + ".pyc", fh.read())
+
+for top in zipped:
+    path = os.path.join(STDLIB, top)
+
+    if top.endswith(".py"):
+        if top != "os.py":
+            os.unlink(path)
+
+        # Remove bytecode of the module, if it was precompiled.
+        pycache = os.path.join(STDLIB, "__pycache__")
+        if top != "os.py" and os.path.isdir(pycache):
+            for f in os.listdir(pycache):
+                if f.startswith(top[:-3] + "."):
+                    os.unlink(os.path.join(pycache, f))
+    else:
+        for root, dirs, files in os.walk(path, topdown=False):
+            for f in files:
+                os.unlink(os.path.join(root, f))
+            for d in dirs:
+                os.rmdir(os.path.join(root, d))
+        os.rmdir(path)
+
+with open(METADATA, "r") as fh:
+    metadata = json.load(fh)
+
+metadata["python_paths"]["stdlib_zip"] = os.path.relpath(
+    ZIP, os.path.join(os.environ["ROOT"], "out", "python")
+)
+
+with open(METADATA, "w") as fh:
+    json.dump(metadata, fh, sort_keys=True, indent=4)
+EOF
+
+    PYTHONHASHSEED=0 ${BUILD_PYTHON} ${ROOT}/zip_stdlib.py \
+        ${ROOT}/out/python/install/lib/python${PYTHON_MAJMIN_VERSION}${PYTHON_LIB_SUFFIX} \
+        ${ROOT}/out/python/install/lib/python${PYTHON_MAJMIN_VERSION/./}${PYTHON_LIB_SUFFIX}.zip \
+        ${ROOT}/metadata.json
+fi
+
 # Also copy object files so they can be linked in a custom manner by
 # downstream consumers.
 OBJECT_DIRS="Objects Parser Parser/lexer Parser/pegen Parser/tokenizer Programs Python Python/deepfreeze"
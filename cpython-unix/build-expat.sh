@@ -26,5 +26,5 @@ CFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" CPPFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" ./
     --without-xmlwf \
     ax_cv_check_cflags___fexceptions=no
 
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS}
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out
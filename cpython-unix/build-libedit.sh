@@ -123,8 +123,8 @@ CFLAGS="${cflags}" CPPFLAGS="${cflags}" LDFLAGS="${ldflags}" \
         --prefix=/tools/deps \
         --disable-shared
 
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS}
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out
 
 # Alias readline/{history.h, readline.h} for readline compatibility.
 if [ -e ${ROOT}/out/tools/deps/include ]; then
@@ -28,5 +28,5 @@ CFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" CPPFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" LD
     --disable-shared \
     ${EXTRA_CONFIGURE}
 
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS}
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out
@@ -4,15 +4,28 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import argparse
+import concurrent.futures
+import contextlib
+import functools
 import multiprocessing
 import os
 import pathlib
+import shutil
 import subprocess
 import sys
 
 from pythonbuild.cpython import meets_python_minimum_version
 from pythonbuild.downloads import DOWNLOADS
+from pythonbuild.jobserver import jobserver, jobserver_token
+from pythonbuild.memory import host_memory, parse_memory_size
+from pythonbuild.profiling import (
+    ActionProfile,
+    format_critical_path,
+    load_profiles,
+    write_chrome_trace,
+)
 from pythonbuild.utils import (
+    compiler_cache_summary,
     compress_python_archive,
     current_host_platform,
     default_target_triple,
@@ -36,9 +49,10 @@ def main():
 
     parser.add_argument(
         "--target-triple",
-        default=default_target_triple(),
+        nargs="+",
+        default=[default_target_triple()],
         choices=supported_targets(TARGETS_CONFIG),
-        help="Target host triple to build for",
+        help="Target host triples to build for",
     )
 
     # Construct possible options, we use a set here for canonical ordering
@@ -48,8 +62,9 @@ def main():
     options.update({f"{option}+static" for option in options})
     parser.add_argument(
         "--options",
+        nargs="+",
         choices=options,
-        default="noopt",
+        default=["noopt"],
         help="Build options to apply when compiling Python",
     )
     parser.add_argument(
@@ -62,14 +77,26 @@ def main():
             "cpython-3.13",
             "cpython-3.14",
         },
-        default="cpython-3.11",
-        help="Python distribution to build",
+        nargs="+",
+        default=["cpython-3.11"],
+        help="Python distributions to build",
     )
     parser.add_argument(
         "--python-source",
         default=None,
         help="A custom path to CPython source files to use",
     )
+    parser.add_argument(
+        "--python-source-incremental",
+        action="store_true",
+        help="Build --python-source incrementally in a persistent source tree",
+    )
+    parser.add_argument(
+        "--archive-manifest",
+        action="store_true",
+        help="Add a python/MANIFEST.json listing the hash of every file to "
+        "distribution archives",
+    )
     parser.add_argument(
         "--break-on-failure",
         action="store_true",
@@ -86,6 +113,85 @@ def main():
         action="store_true",
         help="Build packages serially, without parallelism",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="Number of concurrent jobs shared by all builds",
+    )
+    parser.add_argument(
+        "--no-jobserver",
+        action="store_true",
+        help="Don't share a jobserver between builds",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        default=None,
+        help="Memory concurrent package builds may use (e.g. 48G; 0 for no limit). "
+        "Defaults to 90%% of physical memory",
+    )
+    parser.add_argument(
+        "--compiler-cache",
+        choices={"ccache", "sccache"},
+        default=None,
+        help="Compiler cache program to wrap clang toolchain compilers with",
+    )
+    parser.add_argument(
+        "--compiler-cache-dir",
+        default=str(BUILD / "compiler-cache"),
+        help="Directory persisting the compiler cache between builds",
+    )
+    parser.add_argument(
+        "--artifact-cache",
+        default=None,
+        help="Directory caching built dependency archives by a hash of their inputs",
+    )
+    parser.add_argument(
+        "--artifact-cache-remote",
+        default=None,
+        help="URL of an HTTP server to share cached dependency archives through",
+    )
+    parser.add_argument(
+        "--configure-cache",
+        default=None,
+        help="Directory persisting autoconf cache files between builds",
+    )
+    parser.add_argument(
+        "--cached-pgo-profile",
+        action="store_true",
+        help="Reuse PGO and BOLT profile data of a previous build of the same "
+        "source, target, options and toolchain instead of training",
+    )
+    parser.add_argument(
+        "--pgo-jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes running the PGO training workload "
+        "(default: 1). Keeps the profile in build/pgo-training",
+    )
+    parser.add_argument(
+        "--pgo-workload",
+        default=None,
+        help="Directory of Python scripts to run as PGO training workload",
+    )
+    parser.add_argument(
+        "--pgo-workload-mode",
+        choices={"append", "replace"},
+        default="append",
+        help="Whether the PGO workload runs in addition to or instead of the "
+        "regrtest training workload",
+    )
+    parser.add_argument(
+        "--precompile-bytecode",
+        action="store_true",
+        help="Ship unchecked-hash bytecode of the standard library for all "
+        "optimization levels instead of no bytecode",
+    )
+    parser.add_argument(
+        "--stdlib-zip",
+        action="store_true",
+        help="Move the pure Python standard library into install/lib/pythonXY.zip",
+    )
     parser.add_argument(
         "--make-target",
         choices={
@@ -108,17 +214,12 @@ def main():
 
     args = parser.parse_args()
 
-    target_triple = args.target_triple
-
-    settings = get_target_settings(TARGETS_CONFIG, target_triple)
-
-    supported_pythons = {"cpython-%s" % p for p in settings["pythons_supported"]}
+    if args.python_source and len(args.python) > 1:
+        print("`--python-source` only supports building a single Python")
+        return 1
 
-    if args.python not in supported_pythons:
-        print(
-            "%s only supports following Pythons: %s"
-            % (target_triple, ", ".join(supported_pythons))
-        )
+    if args.python_source_incremental and not args.python_source:
+        print("`--python-source-incremental` requires `--python-source`")
         return 1
 
     python_source = (
@@ -127,74 +228,252 @@ def main():
         else "null"
     )
 
-    musl = "musl" in target_triple
-
     env = dict(os.environ)
 
     env["PYBUILD_HOST_PLATFORM"] = host_platform
-    env["PYBUILD_TARGET_TRIPLE"] = target_triple
-    env["PYBUILD_BUILD_OPTIONS"] = args.options
     env["PYBUILD_PYTHON_SOURCE"] = python_source
-    if musl:
-        env["PYBUILD_MUSL"] = "1"
+    if args.python_source_incremental:
+        env["PYBUILD_PYTHON_SOURCE_INCREMENTAL"] = "1"
     if args.break_on_failure:
         env["PYBUILD_BREAK_ON_FAILURE"] = "1"
+    if args.archive_manifest:
+        env["PYBUILD_ARCHIVE_MANIFEST"] = "1"
     if args.no_docker:
         env["PYBUILD_NO_DOCKER"] = "1"
+    if args.compiler_cache:
+        # Container builds copy the program into the container, so it must be
+        # a statically linked Linux executable in that case.
+        compiler_cache = env.get("PYBUILD_COMPILER_CACHE_PATH") or shutil.which(
+            args.compiler_cache
+        )
+        if not compiler_cache:
+            print(
+                "unable to find %s; set PYBUILD_COMPILER_CACHE_PATH"
+                % args.compiler_cache
+            )
+            return 1
 
-    if not args.python_source:
-        entry = DOWNLOADS[args.python]
-        env["PYBUILD_PYTHON_VERSION"] = cpython_version = entry["version"]
-    else:
-        # TODO consider parsing version from source checkout. Or defining version
-        # from CLI argument.
-        if "PYBUILD_PYTHON_VERSION" not in env:
-            print("PYBUILD_PYTHON_VERSION must be set when using `--python-source`")
+        env["PYBUILD_COMPILER_CACHE"] = str(pathlib.Path(compiler_cache).resolve())
+        env["PYBUILD_COMPILER_CACHE_DIR"] = str(
+            pathlib.Path(args.compiler_cache_dir).resolve()
+        )
+        shutil.rmtree(BUILD / "compiler-cache-stats", ignore_errors=True)
+
+    if args.artifact_cache:
+        env["PYBUILD_ARTIFACT_CACHE"] = str(pathlib.Path(args.artifact_cache).resolve())
+        if args.artifact_cache_remote:
+            env["PYBUILD_ARTIFACT_CACHE_REMOTE"] = args.artifact_cache_remote
+    elif args.artifact_cache_remote:
+        print("--artifact-cache-remote requires --artifact-cache")
+        return 1
+
+    if args.configure_cache:
+        env["PYBUILD_CONFIGURE_CACHE"] = str(
+            pathlib.Path(args.configure_cache).resolve()
+        )
+
+    if args.cached_pgo_profile:
+        env["PYBUILD_CACHED_PGO_PROFILE"] = "1"
+
+    if args.pgo_workload:
+        if not any("pgo" in options for options in args.options):
+            print("--pgo-workload requires building with the pgo option")
             return 1
-        cpython_version = env["PYBUILD_PYTHON_VERSION"]
 
-    python_majmin = ".".join(cpython_version.split(".")[0:2])
+        env["PYBUILD_PGO_WORKLOAD"] = str(pathlib.Path(args.pgo_workload).resolve())
+        env["PYBUILD_PGO_WORKLOAD_MODE"] = args.pgo_workload_mode
+
+    if args.pgo_jobs is not None:
+        env["PYBUILD_PGO_JOBS"] = str(args.pgo_jobs)
+
+    if args.precompile_bytecode:
+        env["PYBUILD_PRECOMPILE_BYTECODE"] = "1"
+    if args.stdlib_zip:
+        env["PYBUILD_STDLIB_ZIP"] = "1"
+
+    # Package builds reserve their expected peak memory usage against this
+    # budget before running.
+    if args.memory_budget is None:
+        memory_budget = int(host_memory() * 0.9)
+    else:
+        memory_budget = parse_memory_size(args.memory_budget)
+
+    if memory_budget:
+        env["PYBUILD_MEMORY_BUDGET"] = str(memory_budget)
+        (BUILD / "memory-reservations.json").unlink(missing_ok=True)
+
+    # Build actions record profiles of themselves, which are merged once the
+    # build completes.
+    profile_dir = BUILD / "profile"
+    shutil.rmtree(profile_dir, ignore_errors=True)
+    env["PYBUILD_PROFILE_DIR"] = str(profile_dir / "actions")
 
     if "PYBUILD_RELEASE_TAG" in os.environ:
         release_tag = os.environ["PYBUILD_RELEASE_TAG"]
     else:
         release_tag = release_tag_from_git()
 
-    # Guard against accidental misuse of the free-threaded flag with older versions
-    if "freethreaded" in args.options and not meets_python_minimum_version(
-        python_majmin, "3.13"
-    ):
-        print(
-            "Invalid build option: 'freethreaded' is only compatible with CPython 3.13+ (got %s)"
-            % cpython_version
-        )
-        return 1
+    # Resolve the environment and archive names of every combination of
+    # target triple, Python and options we build.
+    builds = []
 
-    archive_components = [
-        "cpython-%s" % cpython_version,
-        target_triple,
-        args.options,
-    ]
+    for target_triple in args.target_triple:
+        settings = get_target_settings(TARGETS_CONFIG, target_triple)
 
-    build_basename = "-".join(archive_components) + ".tar"
-    dist_basename = "-".join(archive_components + [release_tag])
+        supported_pythons = {"cpython-%s" % p for p in settings["pythons_supported"]}
 
-    # We run make with static parallelism no greater than the machine's CPU count
-    # because we can get some speedup from parallel operations. But we also don't
-    # share a make job server with each build. So if we didn't limit the
-    # parallelism we could easily oversaturate the CPU. Higher levels of
-    # parallelism don't result in meaningful build speedups because tk has
-    # a long, serial dependency chain that can't be built in parallel.
-    parallelism = min(1 if args.serial else 4, multiprocessing.cpu_count())
+        for python in args.python:
+            if python not in supported_pythons:
+                print(
+                    "%s only supports following Pythons: %s"
+                    % (target_triple, ", ".join(supported_pythons))
+                )
+                return 1
 
-    subprocess.run(
-        ["make", "-j%d" % parallelism, args.make_target], env=env, check=True
-    )
+            if not args.python_source:
+                cpython_version = DOWNLOADS[python]["version"]
+            else:
+                # TODO consider parsing version from source checkout. Or
+                # defining version from CLI argument.
+                if "PYBUILD_PYTHON_VERSION" not in env:
+                    print(
+                        "PYBUILD_PYTHON_VERSION must be set when using `--python-source`"
+                    )
+                    return 1
+                cpython_version = env["PYBUILD_PYTHON_VERSION"]
+
+            python_majmin = ".".join(cpython_version.split(".")[0:2])
+
+            for options in args.options:
+                # Guard against accidental misuse of the free-threaded flag with older versions
+                if "freethreaded" in options and not meets_python_minimum_version(
+                    python_majmin, "3.13"
+                ):
+                    print(
+                        "Invalid build option: 'freethreaded' is only compatible with CPython 3.13+ (got %s)"
+                        % cpython_version
+                    )
+                    return 1
+
+                build_env = dict(env)
+                build_env["PYBUILD_TARGET_TRIPLE"] = target_triple
+                build_env["PYBUILD_BUILD_OPTIONS"] = options
+                build_env["PYBUILD_PYTHON_VERSION"] = cpython_version
+                if "musl" in target_triple:
+                    build_env["PYBUILD_MUSL"] = "1"
+
+                archive_components = [
+                    "cpython-%s" % cpython_version,
+                    target_triple,
+                    options,
+                ]
+
+                build_basename = "-".join(archive_components) + ".tar"
+                dist_basename = "-".join(archive_components + [release_tag])
+
+                # make doesn't know about changes to the checkout. So always
+                # rebuild, which is cheap in the persistent source tree.
+                if args.python_source_incremental:
+                    (BUILD / build_basename).unlink(missing_ok=True)
+
+                builds.append((build_env, build_basename, dist_basename))
 
     DIST.mkdir(exist_ok=True)
 
-    if args.make_target == "default":
-        compress_python_archive(BUILD / build_basename, DIST, dist_basename)
+    def run_build(build_env, build_basename, dist_basename, make_args, job_token):
+        subprocess.run(
+            ["make", *make_args, args.make_target], env=build_env, check=True
+        )
+
+        # Compress as soon as the archive is built, while other builds are
+        # still running.
+        if args.make_target == "default":
+            with job_token():
+                profile = ActionProfile(
+                    "compress-%s" % dist_basename,
+                    str(DIST / ("%s.tar.zst" % dist_basename)),
+                    [str(BUILD / build_basename)],
+                    thread=True,
+                )
+                compress_python_archive(BUILD / build_basename, DIST, dist_basename)
+                profile.write(profile_dir / "actions" / ("%s.json" % dist_basename))
+
+    if args.no_jobserver:
+        # Without a shared jobserver, each build runs its own `make -j` with
+        # the machine's CPU count. So we run make with static parallelism no
+        # greater than the machine's CPU count, as otherwise we could easily
+        # oversaturate the CPU. Higher levels of parallelism don't result in
+        # meaningful build speedups because tk has a long, serial dependency
+        # chain that can't be built in parallel. Builds run one after
+        # another, as concurrent ones would multiply that parallelism.
+        parallelism = min(1 if args.serial else 4, multiprocessing.cpu_count())
+
+        for build_env, build_basename, dist_basename in builds:
+            run_build(
+                build_env,
+                build_basename,
+                dist_basename,
+                ["-j%d" % parallelism],
+                contextlib.nullcontext,
+            )
+    else:
+        # Every build action holds a token from the jobserver while it runs
+        # and compiles within draw from the same pool. So make can schedule
+        # as many actions as it wants: the jobserver bounds the total.
+        BUILD.mkdir(exist_ok=True)
+        jobserver_path = BUILD / "jobserver.fifo"
+        for build_env, _, _ in builds:
+            build_env["PYBUILD_JOBSERVER"] = str(jobserver_path)
+
+        with jobserver(jobserver_path, 1 if args.serial else args.jobs):
+            # Concurrent builds would race to generate settings files. So
+            # generate them upfront.
+            if len(builds) > 1:
+                subprocess.run(["make", "empty"], env=builds[0][0], check=True)
+
+            # Each combination is built by its own make, all running
+            # concurrently and sharing the jobserver. Artifacts common to
+            # multiple builds (toolchains, images and dependencies shared by
+            # Python versions and options) are built by whichever gets to
+            # them first, as build.py serializes builds of the same artifact.
+            with concurrent.futures.ThreadPoolExecutor(len(builds)) as executor:
+                futures = {
+                    executor.submit(
+                        run_build,
+                        build_env,
+                        build_basename,
+                        dist_basename,
+                        ["-j1" if args.serial else "-j"],
+                        functools.partial(jobserver_token, jobserver_path),
+                    ): build_basename
+                    for build_env, build_basename, dist_basename in builds
+                }
+
+                failed = []
+                for future in concurrent.futures.as_completed(futures):
+                    if future.exception():
+                        print(
+                            "error building %s: %s"
+                            % (futures[future], future.exception())
+                        )
+                        failed.append(futures[future])
+
+            if failed:
+                print("failed to build %s" % ", ".join(sorted(failed)))
+                return 1
+
+    if args.compiler_cache:
+        compiler_cache_summary(BUILD / "compiler-cache-stats")
+
+    profiles = load_profiles(profile_dir / "actions")
+    if profiles:
+        write_chrome_trace(profiles, profile_dir / "trace.json")
+        report = format_critical_path(profiles)
+        with (profile_dir / "critical-path.txt").open("w") as fh:
+            fh.write(report)
+
+        print(report)
+        print("build trace written to %s" % (profile_dir / "trace.json"))
 
 
 if __name__ == "__main__":
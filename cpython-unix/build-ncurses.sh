@@ -29,8 +29,8 @@ if [[ -n "${CROSS_COMPILING}" && "${PYBUILD_PLATFORM}" != macos* ]]; then
     --enable-widec \
     --disable-db-install \
     --enable-symlinks
-  make -j ${NUM_CPUS}
-  make -j ${NUM_CPUS} install
+  make ${MAKE_JOBS_FLAGS}
+  make ${MAKE_JOBS_FLAGS} install
 
   popd
 
@@ -112,7 +112,7 @@ fi
 mkdir -p ${ROOT}/out/usr/lib
 
 CFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" CPPFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" LDFLAGS="${EXTRA_TARGET_LDFLAGS}" ./configure ${CONFIGURE_FLAGS}
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS}
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out
 
 mv ${ROOT}/out/usr/share/terminfo ${ROOT}/out/tools/deps/usr/share/
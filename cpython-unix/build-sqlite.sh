@@ -41,7 +41,7 @@ CFLAGS="${EXTRA_TARGET_CFLAGS} \
 CPPFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC" \
 LDFLAGS="${EXTRA_TARGET_LDFLAGS}" ./configure ${CONFIGURE_FLAGS}
 
-make -j ${NUM_CPUS} libsqlite3.a
+make ${MAKE_JOBS_FLAGS} libsqlite3.a
 make install-lib DESTDIR=${ROOT}/out
 make install-headers DESTDIR=${ROOT}/out
 make install-pc DESTDIR=${ROOT}/out
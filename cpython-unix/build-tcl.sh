@@ -61,9 +61,9 @@ CFLAGS="${CFLAGS}" CPPFLAGS="${CFLAGS}" LDFLAGS="${LDFLAGS}" ./configure \
     --enable-shared"${STATIC:+=no}" \
     --enable-threads
 
-make -j ${NUM_CPUS} DYLIB_INSTALL_DIR=@rpath
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out DYLIB_INSTALL_DIR=@rpath
-make -j ${NUM_CPUS} install-private-headers DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS} DYLIB_INSTALL_DIR=@rpath
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out DYLIB_INSTALL_DIR=@rpath
+make ${MAKE_JOBS_FLAGS} install-private-headers DESTDIR=${ROOT}/out
 
 if [ -n "${STATIC}" ]; then
     # For some reason libtcl*.a have weird permissions. Fix that.
@@ -46,8 +46,8 @@ CFLAGS="${CFLAGS}" CPPFLAGS="${CFLAGS}" LDFLAGS="${EXTRA_TARGET_LDFLAGS}" ./conf
     --enable-shared=no \
     ${EXTRA_CONFIGURE_FLAGS}
 
-make -j ${NUM_CPUS}
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS}
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out
 
 # For some reason libtk*.a have weird permissions. Fix that.
 chmod 644 ${ROOT}/out/tools/deps/lib/Tix*/libTix*.a
@@ -62,10 +62,10 @@ if [[ "${PYBUILD_PLATFORM}" != macos* ]]; then
     MAKE_VARS+=(X11_LIB_SWITCHES="-lX11 -lxcb -lXau")
 fi
 
-make -j ${NUM_CPUS} "${MAKE_VARS[@]}"
+make ${MAKE_JOBS_FLAGS} "${MAKE_VARS[@]}"
 touch wish
-make -j ${NUM_CPUS} install DESTDIR=${ROOT}/out "${MAKE_VARS[@]}"
-make -j ${NUM_CPUS} install-private-headers DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS} install DESTDIR=${ROOT}/out "${MAKE_VARS[@]}"
+make ${MAKE_JOBS_FLAGS} install-private-headers DESTDIR=${ROOT}/out
 
 # For some reason libtk*.a have weird permissions. Fix that.
 if [ -n "${STATIC}" ]; then
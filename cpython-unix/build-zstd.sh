@@ -79,7 +79,7 @@ index 2ef33c7..078e2ee 100644
 EOF
 fi
 
-CFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC -DZSTD_MULTITHREAD -O3" LDFLAGS="${EXTRA_TARGET_LDFLAGS}" make -j ${NUM_CPUS} VERBOSE=1 libzstd.a
-make -j ${NUM_CPUS} install-static DESTDIR=${ROOT}/out
-make -j ${NUM_CPUS} install-includes DESTDIR=${ROOT}/out
-MT=1 make -j ${NUM_CPUS} install-pc DESTDIR=${ROOT}/out
+CFLAGS="${EXTRA_TARGET_CFLAGS} -fPIC -DZSTD_MULTITHREAD -O3" LDFLAGS="${EXTRA_TARGET_LDFLAGS}" make ${MAKE_JOBS_FLAGS} VERBOSE=1 libzstd.a
+make ${MAKE_JOBS_FLAGS} install-static DESTDIR=${ROOT}/out
+make ${MAKE_JOBS_FLAGS} install-includes DESTDIR=${ROOT}/out
+MT=1 make ${MAKE_JOBS_FLAGS} install-pc DESTDIR=${ROOT}/out
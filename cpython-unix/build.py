@@ -4,22 +4,37 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import argparse
+import contextlib
+import fcntl
+import hashlib
 import json
 import os
 import pathlib
 import platform
 import re
+import shutil
 import subprocess
 import sys
 import tempfile
 
-import docker
-import zstandard
-
-from pythonbuild.buildenv import build_environment
+from pythonbuild.artifacts import (
+    ARTIFACT_CACHE,
+    ArtifactCache,
+    artifact_cache_key,
+    set_artifact_cache,
+)
+from pythonbuild.buildenv import (
+    CompilerCache,
+    ConfigureCache,
+    build_environment,
+    set_compiler_cache,
+    set_configure_cache,
+    set_container_memory_reservation,
+)
 from pythonbuild.cpython import (
     STDLIB_TEST_PACKAGES,
     derive_setup_local,
+    extension_module_resolver,
     extension_modules_config,
     meets_python_maximum_version,
     meets_python_minimum_version,
@@ -27,15 +42,28 @@ from pythonbuild.cpython import (
 )
 from pythonbuild.docker import build_docker_image, get_image, write_dockerfiles
 from pythonbuild.downloads import DOWNLOADS
+from pythonbuild.jobserver import jobserver_token
 from pythonbuild.logging import log, set_logger
+from pythonbuild.memory import (
+    memory_estimate,
+    memory_reservation,
+    record_memory_usage,
+)
+from pythonbuild.profiling import ActionProfile, set_action_profile
 from pythonbuild.utils import (
     add_env_common,
     add_licenses_to_extension_entry,
     clang_toolchain,
+    compiler_cache_key,
     create_tar_from_directory,
+    dependency_variant,
     download_entry,
+    extract_tar_to_directory,
     get_target_settings,
     get_targets,
+    hash_directory,
+    hash_path,
+    sync_directory,
     target_needs,
     validate_python_json,
     write_cpython_version,
@@ -50,6 +78,23 @@ DOWNLOADS_PATH = BUILD / "downloads"
 SUPPORT = ROOT / "cpython-unix"
 EXTENSION_MODULES = SUPPORT / "extension-modules.yml"
 TARGETS_CONFIG = SUPPORT / "targets.yml"
+MEMORY_ESTIMATES = BUILD / "memory-estimates.json"
+
+# Files of a CPython source tree read by configure or by makesetup, when
+# generating the Makefile. Changes to them, or to files we patch, require
+# incremental source tree builds to start over.
+PYTHON_SOURCE_CONFIGURE_INPUTS = {
+    "Makefile.pre.in",
+    "Modules/Setup",
+    "Modules/Setup.bootstrap.in",
+    "Modules/Setup.stdlib.in",
+    "Modules/config.c.in",
+    "Modules/makesetup",
+    "aclocal.m4",
+    "configure",
+    "configure.ac",
+    "pyconfig.h.in",
+}
 
 LINUX_ALLOW_SYSTEM_LIBRARIES = {
     "c",
@@ -63,8 +108,11 @@ LINUX_ALLOW_SYSTEM_LIBRARIES = {
 MACOS_ALLOW_SYSTEM_LIBRARIES = {"dl", "m", "pthread"}
 MACOS_ALLOW_FRAMEWORKS = {"CoreFoundation"}
 
+# Environment variables of build scripts only controlling their parallelism.
+PARALLELISM_ENV = {"MAKE_JOBS_FLAGS", "NUM_CPUS", "NUM_JOBS_AGGRESSIVE"}
+
 
-def add_target_env(env, build_platform, target_triple, build_env):
+def add_target_env(env, build_platform, target_triple, tools_path):
     add_env_common(env)
 
     settings = get_target_settings(TARGETS_CONFIG, target_triple)
@@ -81,7 +129,7 @@ def add_target_env(env, build_platform, target_triple, build_env):
         env["BOLT_CAPABLE"] = "1"
 
     env["PYBUILD_PLATFORM"] = build_platform
-    env["TOOLS_PATH"] = build_env.tools_path
+    env["TOOLS_PATH"] = tools_path
 
     extra_target_cflags = list(settings.get("target_cflags", []))
     extra_target_ldflags = list(settings.get("target_ldflags", []))
@@ -217,10 +265,317 @@ def toolchain_archive_path(package_name, host_platform):
     return BUILD / basename
 
 
+def artifact_archive_path(
+    package_name, target_triple, build_options, python_version=None
+):
+    entry = DOWNLOADS[package_name]
+
+    basename = "%s-%s-%s-%s.tar" % (
+        package_name,
+        entry["version"],
+        target_triple,
+        dependency_variant(build_options, package_name, python_version),
+    )
+
+    return BUILD / basename
+
+
+def lock_artifact(dest_archive: pathlib.Path):
+    """Obtain exclusive access to building an artifact.
+
+    Concurrent builds of multiple configurations share artifacts like
+    toolchains and dependencies. So two of them may want to build the same
+    artifact at once. The lock is held until the returned file is closed or
+    the process exits. Also returns whether the artifact still needs to be
+    built, as it doesn't if another build produced it while we waited.
+    """
+    lock_path = BUILD / "locks" / ("%s.lock" % dest_archive.name)
+    lock_path.parent.mkdir(exist_ok=True)
+
+    def mtime():
+        try:
+            return dest_archive.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    before = mtime()
+
+    fh = lock_path.open("w")
+    fcntl.flock(fh, fcntl.LOCK_EX)
+
+    after = mtime()
+
+    return fh, after is None or after == before
+
+
 def install_binutils(platform):
     return not platform.startswith("macos_")
 
 
+def recipe_path(archive: pathlib.Path) -> pathlib.Path:
+    return archive.with_name("%s.recipe" % archive.name)
+
+
+def write_recipe(archive: pathlib.Path, key: str):
+    """Record the key of the recipe an archive is built from.
+
+    This is written before the archive, so an archive is never seen without
+    the recipe it was built from.
+    """
+    recipe_path(archive).write_text(key)
+
+
+def archive_recipe(archive: pathlib.Path) -> str:
+    """Obtain the key of the recipe an archive was built from.
+
+    Locally built archives aren't byte for byte reproducible, so keys
+    derived from their content would differ between machines. Archives
+    without a recorded recipe are identified by their content.
+    """
+    try:
+        return recipe_path(archive).read_text()
+    except FileNotFoundError:
+        return hash_path(archive)
+
+
+def toolchain_recipes(host_platform, target_triple, build_options, musl):
+    """Obtain the recipes of the toolchain archives installed by a build."""
+    archives = {}
+
+    if install_binutils(host_platform):
+        archives["binutils"] = archive_recipe(
+            toolchain_archive_path("binutils", host_platform)
+        )
+
+    # The clang toolchain is downloaded. Its download's hash identifies it.
+    clang = clang_toolchain(host_platform, target_triple)
+    archives[clang] = DOWNLOADS[clang]["sha256"]
+
+    if musl:
+        entry = "musl-static" if "static" in build_options else "musl"
+        archives[entry] = archive_recipe(toolchain_archive_path(entry, host_platform))
+
+    return archives
+
+
+def simple_build_cache_key(
+    settings,
+    image,
+    entry,
+    host_platform,
+    target_triple,
+    build_options,
+    extra_archives,
+    tools_path,
+    python_host_version,
+    env,
+):
+    """Compute the artifact cache key of a ``simple_build()`` artifact.
+
+    ``env`` is the build script's environment. The key is also the recipe of
+    the artifact.
+    """
+    # Archives installed into the build environment, by their recipe.
+    archives = {}
+
+    if settings.get("needs_toolchain"):
+        archives.update(
+            toolchain_recipes(
+                host_platform, target_triple, build_options, "musl" in target_triple
+            )
+        )
+
+    for a in extra_archives or []:
+        archives[a] = archive_recipe(
+            artifact_archive_path(a, target_triple, build_options, python_host_version)
+        )
+
+    if python_host_version:
+        majmin = ".".join(python_host_version.split(".")[0:2])
+        archives["cpython-%s" % majmin] = archive_recipe(
+            BUILD
+            / ("cpython-%s-%s-%s.tar" % (majmin, python_host_version, host_platform))
+        )
+
+    return artifact_cache_key(
+        {
+            "script": hash_path(SUPPORT / ("build-%s.sh" % entry)),
+            "download": DOWNLOADS[entry],
+            "settings": settings,
+            "archives": archives,
+            "image": image,
+            "host_platform": host_platform,
+            "target_triple": target_triple,
+            "build_options": dependency_variant(
+                build_options, entry, python_host_version
+            ),
+            "tools_path": tools_path,
+            # Parallelism doesn't affect the artifact.
+            "env": {k: v for k, v in env.items() if k not in PARALLELISM_ENV},
+        }
+    )
+
+
+def configure_cache_key(
+    image, entry, version, host_platform, target_triple, build_options, env, packages
+):
+    """Compute the key of the configure cache of a build.
+
+    ``env`` is the build script's environment and ``packages`` the
+    dependencies installed in the build environment.
+    """
+    return artifact_cache_key(
+        {
+            "package": entry,
+            "version": version,
+            "image": image,
+            "toolchain": DOWNLOADS[clang_toolchain(host_platform, target_triple)][
+                "sha256"
+            ],
+            "target_triple": target_triple,
+            "build_options": build_options,
+            "extra_target_cflags": env.get("EXTRA_TARGET_CFLAGS"),
+            "extra_target_ldflags": env.get("EXTRA_TARGET_LDFLAGS"),
+            "dependencies": {p: DOWNLOADS[p]["version"] for p in sorted(packages)},
+        }
+    )
+
+
+def pgo_profile_cache_key(
+    image,
+    python_archive,
+    host_platform,
+    target_triple,
+    build_options,
+    workload,
+    setup_local,
+    extra_make,
+):
+    """Compute the key of the PGO and BOLT profile data of a CPython build.
+
+    ``setup_local`` and ``extra_make`` are the contents of the generated
+    ``Setup.local`` and ``Makefile.extra`` files.
+    """
+    return artifact_cache_key(
+        {
+            "source": hash_path(python_archive),
+            "script": hash_path(SUPPORT / "build-cpython.sh"),
+            "patches": {p.name: hash_path(p) for p in sorted(SUPPORT.glob("*.patch"))},
+            "setup_local": hashlib.sha256(setup_local).hexdigest(),
+            "extra_make": hashlib.sha256(extra_make).hexdigest(),
+            "workload": workload,
+            "image": image,
+            "toolchain": DOWNLOADS[clang_toolchain(host_platform, target_triple)][
+                "sha256"
+            ],
+            "target_triple": target_triple,
+            "build_options": build_options,
+        }
+    )
+
+
+def pgo_training_variant(build_options):
+    """Identify the PGO training run of a build, for memory estimates."""
+    if "pgo" not in build_options.split("+"):
+        return None
+
+    variant = "j%s" % os.environ.get("PYBUILD_PGO_JOBS", "1")
+
+    if os.environ.get("PYBUILD_PGO_WORKLOAD"):
+        variant += "-%s-%s" % (
+            os.environ.get("PYBUILD_PGO_WORKLOAD_MODE", "append"),
+            hash_directory(pathlib.Path(os.environ["PYBUILD_PGO_WORKLOAD"]))[:16],
+        )
+
+    return variant
+
+
+def patched_python_source_paths():
+    """Obtain the paths in the CPython source tree our patches modify."""
+    paths = set()
+
+    for p in sorted(SUPPORT.glob("patch-*.patch")):
+        with p.open("rb") as fh:
+            for line in fh:
+                if line.startswith(b"+++ "):
+                    # Patches are applied with -p1.
+                    path = line[4:].split()[0].decode("utf-8")
+                    paths.add(path.split("/", 1)[-1])
+
+    return paths
+
+
+def sync_python_source_tree(python_source, python_version, dest_archive, key):
+    """Sync a CPython source checkout into a persistent build tree.
+
+    Only files changed since the previous sync are copied, so builds in the
+    tree are incremental. ``key`` identifies everything else configuring the
+    build. If it changed or configure inputs changed, the tree is recreated.
+
+    Returns the tree and whether it holds a previous build to continue.
+    """
+    base = BUILD / "python-source-trees" / dest_archive.stem
+    tree = base / ("Python-%s" % python_version)
+    manifest_path = base / "manifest.json"
+    state_path = base / "state.json"
+
+    try:
+        with state_path.open("rb") as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        state = {}
+
+    incremental = state.get("key") == key and state.get("built", False)
+
+    if incremental:
+        changed = sync_directory(python_source, tree, manifest_path, excludes=[".git"])
+
+        reconfigure = set(changed) & (
+            PYTHON_SOURCE_CONFIGURE_INPUTS | patched_python_source_paths()
+        )
+        if reconfigure:
+            log(
+                "configure inputs changed (%s); rebuilding %s from scratch"
+                % (", ".join(sorted(reconfigure)), tree)
+            )
+            incremental = False
+        else:
+            log(
+                "%d source files changed; building %s incrementally"
+                % (len(changed), tree)
+            )
+
+    if not incremental:
+        shutil.rmtree(tree, ignore_errors=True)
+        manifest_path.unlink(missing_ok=True)
+        sync_directory(python_source, tree, manifest_path, excludes=[".git"])
+
+    with state_path.open("w") as fh:
+        json.dump({"key": key, "built": False}, fh)
+
+    return tree, incremental
+
+
+def simple_build_env(entry, host_platform, target_triple, build_options, tools_path):
+    """Obtain the environment of a ``simple_build()`` build script."""
+    env = {
+        "%s_VERSION" % entry.upper().replace("-", "_").replace(".", "_"): DOWNLOADS[
+            entry
+        ]["version"],
+    }
+
+    if "static" in build_options:
+        env["STATIC"] = 1
+
+    add_target_env(env, host_platform, target_triple, tools_path)
+
+    if entry in ("openssl-1.1", "openssl-3.0"):
+        settings = get_targets(TARGETS_CONFIG)[target_triple]
+        env["OPENSSL_TARGET"] = settings["openssl_target"]
+
+    return env
+
+
 def simple_build(
     settings,
     client,
@@ -234,6 +589,29 @@ def simple_build(
     tools_path="deps",
     python_host_version=None,
 ):
+    # Artifacts are only cached for Docker builds, as the Docker image pins
+    # down the build environment.
+    cache = ARTIFACT_CACHE[0] if image else None
+
+    cache_key = simple_build_cache_key(
+        settings,
+        image,
+        entry,
+        host_platform,
+        target_triple,
+        build_options,
+        extra_archives,
+        tools_path,
+        python_host_version,
+        # Docker build environments install tools into /tools.
+        simple_build_env(entry, host_platform, target_triple, build_options, "/tools"),
+    )
+
+    write_recipe(dest_archive, cache_key)
+
+    if cache and cache.get(cache_key, dest_archive):
+        return
+
     archive = download_entry(entry, DOWNLOADS_PATH)
 
     with build_environment(client, image) as build_env:
@@ -249,7 +627,9 @@ def simple_build(
             )
 
         for a in extra_archives or []:
-            build_env.install_artifact_archive(BUILD, a, target_triple, build_options)
+            build_env.install_artifact_archive(
+                BUILD, a, target_triple, build_options, python_host_version
+            )
 
         if python_host_version:
             majmin = ".".join(python_host_version.split(".")[0:2])
@@ -263,29 +643,49 @@ def simple_build(
         build_env.copy_file(archive)
         build_env.copy_file(SUPPORT / ("build-%s.sh" % entry))
 
-        env = {
-            "%s_VERSION" % entry.upper().replace("-", "_").replace(".", "_"): DOWNLOADS[
-                entry
-            ]["version"],
-        }
-
-        if "static" in build_options:
-            env["STATIC"] = 1
-
-        add_target_env(env, host_platform, target_triple, build_env)
+        env = simple_build_env(
+            entry, host_platform, target_triple, build_options, build_env.tools_path
+        )
 
-        if entry in ("openssl-1.1", "openssl-3.0"):
-            settings = get_targets(TARGETS_CONFIG)[target_triple]
-            env["OPENSSL_TARGET"] = settings["openssl_target"]
+        env.update(
+            build_env.configure_cache_environment(
+                configure_cache_key(
+                    image,
+                    entry,
+                    DOWNLOADS[entry]["version"],
+                    host_platform,
+                    target_triple,
+                    dependency_variant(build_options, entry, python_host_version),
+                    env,
+                    extra_archives or [],
+                )
+            )
+        )
 
         build_env.run("build-%s.sh" % entry, environment=env)
 
         build_env.get_tools_archive(dest_archive, tools_path)
 
+    if cache:
+        cache.put(cache_key, dest_archive)
+
 
 def build_binutils(client, image, host_platform):
     """Build binutils in the Docker image."""
     archive = download_entry("binutils", DOWNLOADS_PATH)
+    dest_archive = toolchain_archive_path("binutils", host_platform)
+
+    write_recipe(
+        dest_archive,
+        artifact_cache_key(
+            {
+                "script": hash_path(SUPPORT / "build-binutils.sh"),
+                "download": DOWNLOADS["binutils"],
+                "image": image,
+                "host_platform": host_platform,
+            }
+        ),
+    )
 
     with build_environment(client, image) as build_env:
         build_env.copy_file(archive)
@@ -300,13 +700,13 @@ def build_binutils(client, image, host_platform):
             environment=env,
         )
 
-        build_env.get_tools_archive(
-            toolchain_archive_path("binutils", host_platform), "host"
-        )
+        build_env.get_tools_archive(dest_archive, "host")
 
 
 def materialize_clang(host_platform: str, target_triple: str):
     entry = clang_toolchain(host_platform, target_triple)
+    import zstandard
+
     tar_zst = download_entry(entry, DOWNLOADS_PATH)
     local_filename = "%s-%s-%s.tar" % (
         entry,
@@ -325,6 +725,20 @@ def build_musl(client, image, host_platform: str, target_triple: str, build_opti
     static = "static" in build_options
     musl = "musl-static" if static else "musl"
     musl_archive = download_entry(musl, DOWNLOADS_PATH)
+    dest_archive = toolchain_archive_path(musl, host_platform)
+
+    write_recipe(
+        dest_archive,
+        artifact_cache_key(
+            {
+                "script": hash_path(SUPPORT / "build-musl.sh"),
+                "download": DOWNLOADS[musl],
+                "archives": toolchain_recipes(host_platform, target_triple, "", False),
+                "image": image,
+                "host_platform": host_platform,
+            }
+        ),
+    )
 
     with build_environment(client, image) as build_env:
         build_env.install_toolchain(
@@ -348,7 +762,7 @@ def build_musl(client, image, host_platform: str, target_triple: str, build_opti
 
         build_env.run("build-musl.sh", environment=env)
 
-        build_env.get_tools_archive(toolchain_archive_path(musl, host_platform), "host")
+        build_env.get_tools_archive(dest_archive, "host")
 
 
 def build_libedit(
@@ -378,7 +792,22 @@ def build_libedit(
             "LIBEDIT_VERSION": DOWNLOADS["libedit"]["version"],
         }
 
-        add_target_env(env, host_platform, target_triple, build_env)
+        add_target_env(env, host_platform, target_triple, build_env.tools_path)
+
+        env.update(
+            build_env.configure_cache_environment(
+                configure_cache_key(
+                    image,
+                    "libedit",
+                    DOWNLOADS["libedit"]["version"],
+                    host_platform,
+                    target_triple,
+                    dependency_variant(build_options),
+                    env,
+                    ["ncurses"],
+                )
+            )
+        )
 
         build_env.run("build-libedit.sh", environment=env)
         build_env.get_tools_archive(dest_archive, "deps")
@@ -396,6 +825,40 @@ def build_cpython_host(
     """Build binutils in the Docker image."""
     archive = download_entry(entry, DOWNLOADS_PATH)
 
+    support = {
+        "build-cpython-host.sh",
+        "patch-disable-multiarch.patch",
+        "patch-disable-multiarch-13.patch",
+    }
+    packages = {
+        "autoconf",
+        "m4",
+    }
+
+    write_recipe(
+        dest_archive,
+        artifact_cache_key(
+            {
+                "support": {s: hash_path(SUPPORT / s) for s in sorted(support)},
+                "download": DOWNLOADS[entry],
+                "archives": {
+                    **toolchain_recipes(
+                        host_platform, target_triple, build_options, False
+                    ),
+                    **{
+                        p: archive_recipe(
+                            artifact_archive_path(p, target_triple, build_options)
+                        )
+                        for p in sorted(packages)
+                    },
+                },
+                "image": image,
+                "host_platform": host_platform,
+                "target_triple": target_triple,
+            }
+        ),
+    )
+
     with build_environment(client, image) as build_env:
         python_version = DOWNLOADS[entry]["version"]
 
@@ -410,18 +873,9 @@ def build_cpython_host(
 
         build_env.copy_file(archive)
 
-        support = {
-            "build-cpython-host.sh",
-            "patch-disable-multiarch.patch",
-            "patch-disable-multiarch-13.patch",
-        }
         for s in sorted(support):
             build_env.copy_file(SUPPORT / s)
 
-        packages = {
-            "autoconf",
-            "m4",
-        }
         for p in sorted(packages):
             build_env.install_artifact_archive(BUILD, p, target_triple, build_options)
 
@@ -429,7 +883,7 @@ def build_cpython_host(
             "PYTHON_VERSION": python_version,
         }
 
-        add_target_env(env, host_platform, target_triple, build_env)
+        add_target_env(env, host_platform, target_triple, build_env.tools_path)
 
         # Set environment variables allowing convenient testing for Python
         # version ranges.
@@ -709,6 +1163,10 @@ def build_cpython(
     if not python_source:
         python_version = entry["version"]
         python_archive = download_entry(entry_name, DOWNLOADS_PATH)
+    elif os.environ.get("PYBUILD_PYTHON_SOURCE_INCREMENTAL") and client:
+        # The checkout is synced into a persistent source tree instead.
+        python_version = os.environ["PYBUILD_PYTHON_VERSION"]
+        python_archive = None
     else:
         python_version = os.environ["PYBUILD_PYTHON_VERSION"]
         python_archive = DOWNLOADS_PATH / ("Python-%s.tar.xz" % python_version)
@@ -723,19 +1181,51 @@ def build_cpython(
 
     ems = extension_modules_config(EXTENSION_MODULES)
 
+    # A source checkout is read directly rather than from the archive made
+    # of it.
     setup = derive_setup_local(
-        python_archive,
+        python_source or python_archive,
         python_version=python_version,
         target_triple=target_triple,
         build_options=parsed_build_options,
-        extension_modules=ems,
+        resolver=extension_module_resolver(EXTENSION_MODULES),
     )
 
     enabled_extensions = setup["extensions"]
     setup_local_content = setup["setup_local"]
     extra_make_content = setup["make_data"]
 
-    with build_environment(client, image) as build_env:
+    source_tree = None
+    incremental = False
+
+    if python_source and not python_archive:
+        source_tree, incremental = sync_python_source_tree(
+            python_source,
+            python_version,
+            dest_archive,
+            artifact_cache_key(
+                {
+                    "image": image,
+                    "target_triple": target_triple,
+                    "build_options": build_options,
+                    "setup_local": setup_local_content.decode("utf-8"),
+                    "make_data": extra_make_content.decode("utf-8"),
+                    "scripts": {
+                        p.name: hash_path(p)
+                        for p in sorted(SUPPORT.glob("patch-*.patch"))
+                        + [SUPPORT / "build-cpython.sh"]
+                    },
+                    "packages": {
+                        p: DOWNLOADS[p]["version"]
+                        for p in sorted(
+                            target_needs(TARGETS_CONFIG, target_triple, python_version)
+                        )
+                    },
+                }
+            ),
+        )
+
+    with build_environment(client, image, source_tree=source_tree) as build_env:
         if settings.get("needs_toolchain"):
             build_env.install_toolchain(
                 BUILD,
@@ -753,15 +1243,19 @@ def build_cpython(
         packages.discard("musl")
 
         for p in sorted(packages):
-            build_env.install_artifact_archive(BUILD, p, target_triple, build_options)
+            build_env.install_artifact_archive(
+                BUILD, p, target_triple, build_options, python_version
+            )
 
         # Install the host CPython.
         build_env.install_toolchain_archive(
             BUILD, entry_name, host_platform, version=python_version
         )
 
+        if python_archive:
+            build_env.copy_file(python_archive)
+
         for p in (
-            python_archive,
             setuptools_archive,
             pip_archive,
             SUPPORT / "build-cpython.sh",
@@ -823,10 +1317,136 @@ def build_cpython(
         if "static" in parsed_build_options:
             env["CPYTHON_STATIC"] = "1"
 
-        add_target_env(env, host_platform, target_triple, build_env)
+        # Bytecode shipped in the distribution, if any.
+        precompiled_bytecode = None
+
+        if os.environ.get("PYBUILD_PRECOMPILE_BYTECODE"):
+            precompiled_bytecode = {
+                "invalidation_mode": "unchecked-hash",
+                "optimization_levels": [0, 1, 2],
+            }
+            env["CPYTHON_PRECOMPILE_BYTECODE"] = "1"
+
+        if os.environ.get("PYBUILD_STDLIB_ZIP"):
+            env["CPYTHON_STDLIB_ZIP"] = "1"
+
+        if source_tree:
+            env["CPYTHON_SOURCE_TREE"] = "1"
+        if incremental:
+            env["CPYTHON_INCREMENTAL"] = "1"
+
+        # A custom training workload: a directory of scripts run by the
+        # instrumented interpreter, alongside or instead of regrtest.
+        pgo_workload = None
+
+        if "pgo" in parsed_build_options and os.environ.get("PYBUILD_PGO_WORKLOAD"):
+            workload_path = pathlib.Path(os.environ["PYBUILD_PGO_WORKLOAD"])
+            pgo_workload = {
+                "mode": os.environ.get("PYBUILD_PGO_WORKLOAD_MODE", "append"),
+                "sha256": hash_directory(workload_path),
+            }
+
+            with tempfile.TemporaryDirectory() as td:
+                workload_archive = pathlib.Path(td) / "pgo-workload.tar"
+                with workload_archive.open("wb") as fh:
+                    create_tar_from_directory(
+                        fh, workload_path, path_prefix="pgo-workload"
+                    )
+
+                build_env.copy_file(workload_archive)
+
+            build_env.copy_file(SUPPORT / "run_pgo_workload.py")
+
+            env["CPYTHON_PGO_WORKLOAD"] = "1"
+            env["CPYTHON_PGO_WORKLOAD_MODE"] = pgo_workload["mode"]
+
+        # Profile data of a previous build lets us skip the instrumented
+        # training runs. Without an artifact cache, profiles are kept locally.
+        # Source trees keep their profile data themselves. Profiles are only
+        # stored and reused with --cached-pgo-profile.
+        profile_key = None
+
+        if "pgo" in parsed_build_options:
+            if python_archive:
+                profile_cache = ARTIFACT_CACHE[0] or ArtifactCache(
+                    BUILD / "pgo-profiles"
+                )
+                profile_key = pgo_profile_cache_key(
+                    image,
+                    python_archive,
+                    host_platform,
+                    target_triple,
+                    build_options,
+                    pgo_workload,
+                    setup_local_content,
+                    extra_make_content,
+                )
+
+            if profile_key and os.environ.get("PYBUILD_CACHED_PGO_PROFILE"):
+                with tempfile.TemporaryDirectory() as td:
+                    profile_archive = pathlib.Path(td) / "pgo-profile.tar"
+
+                    if profile_cache.get(profile_key, profile_archive):
+                        build_env.copy_file(profile_archive)
+                        env["CPYTHON_CACHED_PROFILE"] = "1"
+
+            # The number of worker processes running the training workload.
+            env["CPYTHON_PGO_JOBS"] = os.environ.get("PYBUILD_PGO_JOBS", "1")
+
+        add_target_env(env, host_platform, target_triple, build_env.tools_path)
+
+        env.update(
+            build_env.configure_cache_environment(
+                configure_cache_key(
+                    image,
+                    entry_name,
+                    python_version,
+                    host_platform,
+                    target_triple,
+                    build_options,
+                    env,
+                    packages,
+                )
+            )
+        )
 
         build_env.run("build-cpython.sh", environment=env)
 
+        if source_tree:
+            with (source_tree.parent / "state.json").open("r+") as fh:
+                state = json.load(fh)
+                state["built"] = True
+                fh.seek(0)
+                fh.truncate()
+                json.dump(state, fh)
+
+        # The build script exports profile data if it trained a new profile.
+        training_dir = None
+
+        if profile_key and list(
+            build_env.find_output_files("pgo-profile", "training.json")
+        ):
+            with tempfile.TemporaryDirectory() as td:
+                profile_archive = pathlib.Path(td) / "pgo-profile.tar"
+                profile_archive.write_bytes(build_env.get_output_archive("pgo-profile"))
+
+                if os.environ.get("PYBUILD_CACHED_PGO_PROFILE"):
+                    profile_cache.put(profile_key, profile_archive)
+
+                # Keep the profile of an explicitly configured training mode,
+                # so modes can be compared with compare-pgo-training.py.
+                if os.environ.get("PYBUILD_PGO_JOBS"):
+                    training_dir = (
+                        BUILD
+                        / "pgo-training"
+                        / ("%s.j%s" % (dest_archive.stem, env["CPYTHON_PGO_JOBS"]))
+                    )
+                    shutil.rmtree(training_dir, ignore_errors=True)
+                    extract_tar_to_directory(profile_archive, training_dir)
+
+                    with (training_dir / "pgo-profile" / "training.json").open() as fh:
+                        log("PGO training: %s" % json.dumps(json.load(fh)))
+
         extension_module_loading = ["builtin"]
         crt_features = []
 
@@ -909,6 +1529,12 @@ def build_cpython(
             "tk8.6",
         ]
 
+        if pgo_workload:
+            python_info["pgo_workload"] = pgo_workload
+
+        if precompiled_bytecode:
+            python_info["precompiled_bytecode"] = precompiled_bytecode
+
         if "-apple" in target_triple:
             python_info["apple_sdk_platform"] = env["APPLE_SDK_PLATFORM"]
             python_info["apple_sdk_version"] = env["APPLE_SDK_VERSION"]
@@ -934,7 +1560,15 @@ def build_cpython(
             build_env.copy_file(fh.name, dest_path, dest_name="PYTHON.json")
 
         with open(dest_archive, "wb") as fh:
-            fh.write(build_env.get_output_archive("python"))
+            fh.write(
+                build_env.get_output_archive(
+                    "python",
+                    manifest=bool(os.environ.get("PYBUILD_ARCHIVE_MANIFEST")),
+                )
+            )
+
+        if training_dir:
+            shutil.copyfile(dest_archive, training_dir / "python.tar")
 
 
 def main():
@@ -942,16 +1576,6 @@ def main():
     DOWNLOADS_PATH.mkdir(exist_ok=True)
     (BUILD / "logs").mkdir(exist_ok=True)
 
-    if os.environ.get("PYBUILD_NO_DOCKER"):
-        client = None
-    else:
-        try:
-            client = docker.from_env(timeout=600)
-            client.ping()
-        except Exception as e:
-            print("unable to connect to Docker: %s" % e, file=sys.stderr)
-            return 1
-
     # Note these arguments must be synced with `build-main.py`
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -1013,6 +1637,20 @@ def main():
 
     settings = get_target_settings(TARGETS_CONFIG, target_triple)
 
+    # The makefiles and dockerfiles actions run on every make invocation. So
+    # they avoid the cost of importing docker and connecting to it.
+    if os.environ.get("PYBUILD_NO_DOCKER") or action in ("dockerfiles", "makefiles"):
+        client = None
+    else:
+        import docker
+
+        try:
+            client = docker.from_env(timeout=600)
+            client.ping()
+        except Exception as e:
+            print("unable to connect to Docker: %s" % e, file=sys.stderr)
+            return 1
+
     if args.action == "dockerfiles":
         log_name = "dockerfiles"
     elif args.action == "makefiles":
@@ -1029,13 +1667,100 @@ def main():
             action,
             entry["version"],
             target_triple,
-            build_options,
+            build_options
+            if action.startswith("cpython-")
+            else dependency_variant(build_options, action, python_host_version),
         )
 
     log_path = BUILD / "logs" / ("build.%s.log" % log_name)
 
-    with log_path.open("wb") as log_fh:
-        set_logger(action, log_fh)
+    if action not in ("dockerfiles", "makefiles"):
+        # The lock is held until we exit.
+        lock, needs_build = lock_artifact(dest_archive)
+        if not needs_build:
+            print("%s was built concurrently; not rebuilding" % dest_archive)
+            return 0
+
+    if os.environ.get("PYBUILD_COMPILER_CACHE"):
+        set_compiler_cache(
+            CompilerCache(
+                pathlib.Path(os.environ["PYBUILD_COMPILER_CACHE"]),
+                pathlib.Path(os.environ["PYBUILD_COMPILER_CACHE_DIR"])
+                / compiler_cache_key(host_platform, target_triple),
+                BUILD / "compiler-cache-stats" / ("%s.json" % log_name),
+            )
+        )
+
+    if os.environ.get("PYBUILD_ARTIFACT_CACHE"):
+        set_artifact_cache(
+            ArtifactCache(
+                pathlib.Path(os.environ["PYBUILD_ARTIFACT_CACHE"]),
+                os.environ.get("PYBUILD_ARTIFACT_CACHE_REMOTE"),
+            )
+        )
+
+    if os.environ.get("PYBUILD_CONFIGURE_CACHE"):
+        set_configure_cache(
+            ConfigureCache(pathlib.Path(os.environ["PYBUILD_CONFIGURE_CACHE"]))
+        )
+
+    # Hold a job token from the shared jobserver while building. Settings
+    # files are generated when make parses the Makefile, outside of its
+    # scheduling, so they don't need one.
+    if os.environ.get("PYBUILD_JOBSERVER") and action not in (
+        "dockerfiles",
+        "makefiles",
+    ):
+        job_token = jobserver_token(pathlib.Path(os.environ["PYBUILD_JOBSERVER"]))
+    else:
+        job_token = contextlib.nullcontext()
+
+    # Reserve the memory the action is expected to use against the host's
+    # budget, before taking a job token so waiting for memory doesn't keep
+    # other actions from running.
+    pgo = pgo_training_variant(build_options)
+
+    if os.environ.get("PYBUILD_MEMORY_BUDGET") and action not in (
+        "dockerfiles",
+        "makefiles",
+    ):
+        estimate, learned = memory_estimate(
+            MEMORY_ESTIMATES, action, build_options, pgo
+        )
+        memory = memory_reservation(
+            BUILD / "memory-reservations.json",
+            int(os.environ["PYBUILD_MEMORY_BUDGET"]),
+            estimate,
+        )
+
+        # Under memory pressure, reclaim memory from containers exceeding
+        # estimates learned from previous runs first. A hard limit would kill
+        # builds whose usage legitimately grew.
+        if learned:
+            set_container_memory_reservation(estimate)
+    else:
+        memory = contextlib.nullcontext()
+
+    # Log waiting for memory to the action's log.
+    log_fh = log_path.open("wb")
+    set_logger(action, log_fh)
+
+    with log_fh, memory, job_token:
+        # Profile the action once it is admitted to run, so waiting for a
+        # job token shows up as scheduling delay.
+        if os.environ.get("PYBUILD_PROFILE_DIR") and action not in (
+            "dockerfiles",
+            "makefiles",
+        ):
+            profile = ActionProfile(
+                log_name,
+                str(dest_archive),
+                os.environ.get("PYBUILD_PROFILE_DEPENDS", "").split(),
+            )
+            set_action_profile(profile)
+        else:
+            profile = None
+
         if action == "dockerfiles":
             write_dockerfiles(SUPPORT, BUILD)
         elif action == "makefiles":
@@ -1161,6 +1886,7 @@ def main():
                     "xorgproto",
                     "xtrans",
                 },
+                python_host_version=python_host_version,
             )
 
         elif action == "libXau":
@@ -1262,6 +1988,16 @@ def main():
             print("unknown build action: %s" % action)
             return 1
 
+        if profile:
+            peak_rss = profile.write(
+                pathlib.Path(os.environ["PYBUILD_PROFILE_DIR"]) / ("%s.json" % log_name)
+            )
+
+            if peak_rss:
+                record_memory_usage(
+                    MEMORY_ESTIMATES, action, build_options, peak_rss, pgo
+                )
+
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Run a custom PGO training workload.
+
+Runs every ``*.py`` script in a directory, in sorted order and with the
+directory as the working directory, using the interpreter running this
+script. Further arguments are passed to another invocation of the
+interpreter after the scripts ran. e.g.:
+
+    $ python run_pgo_workload.py --jobs 4 workload/ -m test --pgo
+
+Scripts run with a fixed hash seed, so the workload is reproducible.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import pathlib
+import subprocess
+import sys
+
+
+def run_script(script):
+    env = dict(os.environ)
+    env["PYTHONHASHSEED"] = "0"
+
+    print("running PGO workload script %s" % script.name, flush=True)
+    subprocess.run(
+        [sys.executable, script.name], cwd=script.parent, env=env, check=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="Number of scripts to run concurrently"
+    )
+    parser.add_argument("directory", help="Directory containing workload scripts")
+    parser.add_argument("python_args", nargs=argparse.REMAINDER)
+
+    args = parser.parse_args()
+
+    scripts = sorted(pathlib.Path(args.directory).glob("*.py"))
+    if not scripts:
+        print("no *.py scripts in %s" % args.directory)
+        return 1
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for _ in executor.map(run_script, scripts):
+            pass
+
+    if args.python_args:
+        return subprocess.run([sys.executable] + args.python_args).returncode
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1280,6 +1280,7 @@ def build_cpython(
     openssl_archive,
     libffi_archive,
     openssl_entry: str,
+    archive_manifest: bool = False,
 ) -> pathlib.Path:
     parsed_build_options = set(build_options.split("+"))
     pgo = "pgo" in parsed_build_options
@@ -1785,7 +1786,7 @@ def build_cpython(
         create_tar_from_directory(data, td / "out")
         data.seek(0)
 
-        data = normalize_tar_archive(data)
+        data = normalize_tar_archive(data, manifest=archive_manifest)
 
         with dest_path.open("wb") as fh:
             while True:
@@ -1845,6 +1846,12 @@ def main() -> None:
         default="10.0.26100.0",
         help="Windows SDK version to build with",
     )
+    parser.add_argument(
+        "--archive-manifest",
+        action="store_true",
+        help="Add a python/MANIFEST.json listing the hash of every file to "
+        "the distribution archive",
+    )
 
     args = parser.parse_args()
     build_options = args.options
@@ -1910,6 +1917,7 @@ def main() -> None:
             openssl_archive=openssl_archive,
             libffi_archive=libffi_archive,
             openssl_entry=openssl_entry,
+            archive_manifest=args.archive_manifest,
         )
 
         if "PYBUILD_RELEASE_TAG" in os.environ:
@@ -0,0 +1,108 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""A cache of built artifacts keyed by a hash of their inputs.
+
+Artifacts are stored in a local directory. An optional remote is a plain
+HTTP server: artifacts are fetched with ``GET <remote>/<key>.tar`` and
+published with ``PUT <remote>/<key>.tar``. A remote not accepting uploads
+(e.g. ``python -m http.server``) can be used read-only.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from .logging import log
+
+ARTIFACT_CACHE: list[Optional["ArtifactCache"]] = [None]
+
+
+def set_artifact_cache(cache):
+    """Register an ``ArtifactCache`` to use for subsequent builds."""
+    ARTIFACT_CACHE[0] = cache
+
+
+def artifact_cache_key(inputs: dict) -> str:
+    """Derive the cache key of an artifact from a dict describing its inputs."""
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class ArtifactCache(object):
+    def __init__(self, path: pathlib.Path, remote: Optional[str] = None):
+        self.path = path
+        self.remote = remote.rstrip("/") if remote else None
+
+    def _local_path(self, key: str) -> pathlib.Path:
+        # Same layout as the remote, so a cache directory can be served as one.
+        return self.path / ("%s.tar" % key)
+
+    def _store(self, key: str, fh):
+        dest = self._local_path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file and rename so concurrent builds never
+        # observe a partial artifact.
+        temp = dest.with_name("%s.%d.tmp" % (dest.name, os.getpid()))
+        try:
+            with temp.open("wb") as ofh:
+                shutil.copyfileobj(fh, ofh)
+            temp.rename(dest)
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def get(self, key: str, dest: pathlib.Path) -> bool:
+        """Materialize the artifact with ``key`` at ``dest``, if cached."""
+        local = self._local_path(key)
+
+        if not local.exists() and self.remote:
+            url = "%s/%s.tar" % (self.remote, key)
+            try:
+                with urllib.request.urlopen(url) as fh:
+                    self._store(key, fh)
+                log("fetched %s from artifact cache remote" % key)
+            except urllib.error.HTTPError as e:
+                if e.code != 404:
+                    log("error fetching %s: %s" % (url, e))
+            except urllib.error.URLError as e:
+                log("error fetching %s: %s" % (url, e))
+
+        if not local.exists():
+            log("artifact cache miss: %s" % key)
+            return False
+
+        log("artifact cache hit: %s" % key)
+        shutil.copyfile(local, dest)
+        return True
+
+    def put(self, key: str, source: pathlib.Path):
+        """Store the artifact at ``source`` under ``key``."""
+        with source.open("rb") as fh:
+            self._store(key, fh)
+
+        if not self.remote:
+            return
+
+        url = "%s/%s.tar" % (self.remote, key)
+        req = urllib.request.Request(
+            url,
+            data=source.read_bytes(),
+            method="PUT",
+            headers={"Content-Type": "application/x-tar"},
+        )
+
+        # Failing to publish an artifact shouldn't fail the build.
+        try:
+            with urllib.request.urlopen(req):
+                pass
+            log("published %s to artifact cache remote" % key)
+        except urllib.error.URLError as e:
+            log("error publishing %s: %s" % (url, e))
@@ -0,0 +1,228 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Running code in distribution archives and summarizing measurements.
+
+Shared by the scripts benchmarking and verifying built distributions.
+"""
+
+import json
+import math
+import pathlib
+import statistics
+import subprocess
+import tarfile
+import tempfile
+
+# Two-sided 95% critical values of Student's t-distribution by degrees of
+# freedom. Larger degrees of freedom use the closest smaller entry.
+T_CRITICAL_95 = {
+    1: 12.706,
+    2: 4.303,
+    3: 3.182,
+    4: 2.776,
+    5: 2.571,
+    6: 2.447,
+    7: 2.365,
+    8: 2.306,
+    9: 2.262,
+    10: 2.228,
+    12: 2.179,
+    15: 2.131,
+    20: 2.086,
+    25: 2.060,
+    30: 2.042,
+    40: 2.021,
+    60: 2.000,
+    120: 1.980,
+}
+
+
+class Distribution(object):
+    """A distribution archive extracted to a directory."""
+
+    def __init__(self, archive: pathlib.Path, root: pathlib.Path, info: dict):
+        self.archive = archive
+        self.root = root
+        self.info = info
+
+    @property
+    def name(self) -> str:
+        name = self.archive.name
+        for suffix in (".tar.zst", ".tar"):
+            if name.endswith(suffix):
+                return name[: -len(suffix)]
+
+        return name
+
+    @property
+    def python_exe(self) -> pathlib.Path:
+        return self.root / str(self.info["python_exe"])
+
+    def describe(self) -> dict:
+        """Obtain the ``PYTHON.json`` keys identifying this distribution."""
+        return {
+            "archive": self.archive.name,
+            "python_version": self.info["python_version"],
+            "target_triple": self.info["target_triple"],
+            "build_options": self.info["build_options"],
+        }
+
+    def run_python(self, args, **kwargs) -> subprocess.CompletedProcess:
+        """Run the distribution's interpreter in isolated mode."""
+        return subprocess.run(
+            [str(self.python_exe), "-I", *args],
+            capture_output=True,
+            text=True,
+            **kwargs,
+        )
+
+    def run_json(self, code: str, arg) -> dict:
+        """Run code printing a JSON document with the interpreter.
+
+        ``arg`` is passed to the code JSON encoded in ``sys.argv[1]``.
+        """
+        res = self.run_python(["-c", code, json.dumps(arg)])
+
+        if res.returncode:
+            raise Exception(
+                "%s exited with %d: %s"
+                % (self.python_exe, res.returncode, res.stderr.strip())
+            )
+
+        return json.loads(res.stdout)  # type: ignore[no-any-return]
+
+
+def extract_distribution(archive: pathlib.Path, dest: pathlib.Path) -> Distribution:
+    """Extract a full distribution archive."""
+    dest.mkdir(parents=True)
+
+    if archive.name.endswith(".zst"):
+        import zstandard
+
+        with archive.open("rb") as fh:
+            dctx = zstandard.ZstdDecompressor()
+            with dctx.stream_reader(fh) as reader:
+                with tarfile.open(mode="r|", fileobj=reader) as tf:
+                    tf.extractall(dest)
+    else:
+        with tarfile.open(archive) as tf:
+            tf.extractall(dest)
+
+    root = dest / "python"
+
+    with (root / "PYTHON.json").open("rb") as fh:
+        info = json.load(fh)
+
+    return Distribution(archive, root, info)
+
+
+def add_report_arguments(parser):
+    """Register the arguments of ``collect_reports()`` and ``write_reports()``."""
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Distribution archives (.tar.zst) or earlier JSON reports",
+    )
+    parser.add_argument("--output", help="Path to write a JSON report to")
+
+
+def collect_reports(inputs: list[str], measure) -> list[dict]:
+    """Measure distribution archives and load earlier JSON reports.
+
+    ``measure`` is called with the ``Distribution`` of each archive and
+    returns its report.
+    """
+    reports = []
+
+    with tempfile.TemporaryDirectory() as td:
+        for i, p in enumerate(inputs):
+            path = pathlib.Path(p)
+
+            if path.suffix == ".json":
+                with path.open("rb") as fh:
+                    reports.extend(json.load(fh)["distributions"])
+            else:
+                reports.append(
+                    measure(extract_distribution(path, pathlib.Path(td) / str(i)))
+                )
+
+    return reports
+
+
+def write_reports(path, reports: list[dict]):
+    """Write reports to a JSON file ``collect_reports()`` can load."""
+    with open(path, "w") as fh:
+        json.dump({"version": 1, "distributions": reports}, fh, indent=2)
+
+
+def print_legend(labels: list[str]):
+    """Print the labels of the numbered columns of ``print_report_table()``."""
+    for i, label in enumerate(labels):
+        print("[%d] %s" % (i + 1, label))
+    print()
+
+
+def print_report_table(header: list[str], rows: list[list[str]]):
+    """Print a table with a column per report, numbered as by ``print_legend()``.
+
+    ``header`` names the leading columns of each row, followed by a cell per
+    report.
+    """
+    reports = len(rows[0]) - len(header) if rows else 0
+    rows = [header + ["[%d]" % (i + 1) for i in range(reports)]] + rows
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+
+    for row in rows:
+        print(
+            "  ".join(
+                cell.ljust(width) for cell, width in zip(row, widths, strict=True)
+            ).rstrip()
+        )
+
+
+def t_critical(df: int) -> float:
+    """Obtain the two-sided 95% critical value of the t-distribution."""
+    return T_CRITICAL_95[max(k for k in T_CRITICAL_95 if k <= max(df, 1))]
+
+
+def summarize(values: list[float]) -> dict:
+    """Summarize samples with their mean and 95% confidence interval."""
+    mean = statistics.fmean(values)
+    stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+
+    return {
+        "mean": mean,
+        "stdev": stdev,
+        "ci95": t_critical(len(values) - 1) * stdev / math.sqrt(len(values)),
+        "samples": len(values),
+    }
+
+
+def compare_summaries(base: dict, other: dict) -> dict:
+    """Compare the means of two summaries.
+
+    Returns the change of ``other`` relative to ``base`` in percent, with the
+    95% confidence interval of Welch's t-test, and whether the change is
+    significant.
+    """
+    va = base["stdev"] ** 2 / base["samples"]
+    vb = other["stdev"] ** 2 / other["samples"]
+    diff = other["mean"] - base["mean"]
+
+    if va + vb:
+        # Welch–Satterthwaite degrees of freedom.
+        df = (va + vb) ** 2 / (
+            va**2 / max(base["samples"] - 1, 1) + vb**2 / max(other["samples"] - 1, 1)
+        )
+        ci = t_critical(int(df)) * math.sqrt(va + vb)
+    else:
+        ci = 0.0
+
+    return {
+        "change": diff / base["mean"] * 100.0,
+        "ci95": ci / base["mean"] * 100.0,
+        "significant": abs(diff) > ci,
+    }
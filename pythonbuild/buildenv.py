@@ -5,27 +5,221 @@
 import contextlib
 import fnmatch
 import io
+import json
 import os
 import pathlib
+import shlex
 import shutil
+import subprocess
 import tarfile
 import tempfile
 
-from .docker import container_exec, container_get_archive, copy_file_to_container
+from .docker import (
+    container_exec,
+    container_get_archive,
+    container_resource_usage,
+    copy_file_to_container,
+)
 from .downloads import DOWNLOADS
+from .jobserver import CONTAINER_JOBSERVER_PATH, jobserver_command
 from .logging import log
+from .profiling import (
+    add_profile_build_environment,
+    add_profile_usage,
+    profile_active,
+    profile_span,
+)
 from .utils import (
     clang_toolchain,
     create_tar_from_directory,
+    dependency_variant,
     exec_and_log,
     extract_tar_to_directory,
     normalize_tar_archive,
+    write_if_different,
 )
 
+COMPILER_CACHE = [None]
+CONFIGURE_CACHE = [None]
+
+# Where containers keep the compiler cache: a directory in the mounted host
+# cache directory, owned by the build user. The host directory itself keeps
+# its owner.
+CONTAINER_COMPILER_CACHE = "/compiler-cache/container"
+CONTAINER_CONFIGURE_CACHE = "/configure-cache/container"
+CONTAINER_MEMORY_RESERVATION = [None]
+
+
+def set_compiler_cache(cache):
+    """Register a ``CompilerCache`` to use in subsequent build environments."""
+    COMPILER_CACHE[0] = cache
+
+
+def set_configure_cache(cache):
+    """Register a ``ConfigureCache`` to use in subsequent build environments."""
+    CONFIGURE_CACHE[0] = cache
+
+
+def set_container_memory_reservation(reservation):
+    """Register the soft memory limit, in bytes, of subsequent build containers."""
+    CONTAINER_MEMORY_RESERVATION[0] = reservation
+
+
+class CompilerCache(object):
+    """An opt-in compiler cache (ccache or sccache) shared between builds.
+
+    ``launcher`` is the host path to the ``ccache`` or ``sccache`` executable.
+    For container builds, it must be a statically linked Linux executable, as
+    it is copied into the container. ``cache_dir`` is a host directory that
+    persists between builds. ``stats_path`` is where hit/miss statistics for
+    the current build are written.
+    """
+
+    # Compiler drivers in the clang toolchain that are routed through the
+    # cache.
+    COMPILERS = ("clang", "clang++")
+
+    def __init__(
+        self, launcher: pathlib.Path, cache_dir: pathlib.Path, stats_path: pathlib.Path
+    ):
+        if launcher.name not in ("ccache", "sccache"):
+            raise Exception("unsupported compiler cache program: %s" % launcher)
+
+        self.launcher = launcher
+        self.cache_dir = cache_dir
+        self.stats_path = stats_path
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def name(self):
+        return self.launcher.name
+
+    def environment(self, cache_dir: str, base_dir: str):
+        """Environment variables configuring the cache program."""
+        if self.name == "ccache":
+            return {
+                "CCACHE_DIR": cache_dir,
+                # Rewrite absolute paths under the build directory so results
+                # are shared between builds in different temporary directories.
+                "CCACHE_BASEDIR": base_dir,
+                "CCACHE_NOHASHDIR": "1",
+            }
+        else:
+            return {"SCCACHE_DIR": cache_dir}
+
+    def wrapper(self, launcher: str, compiler: str, cache_dir: str, base_dir: str):
+        """Content of a script standing in for a compiler driver."""
+        lines = ["#!/bin/sh"]
+        for k, v in sorted(self.environment(cache_dir, base_dir).items()):
+            lines.append("export %s=%s" % (k, shlex.quote(v)))
+        lines.append('exec %s %s "$@"' % (shlex.quote(launcher), shlex.quote(compiler)))
+        lines.append("")
+
+        return "\n".join(lines).encode("utf-8")
+
+    def stats_args(self, launcher: str):
+        if self.name == "ccache":
+            return [launcher, "--print-stats"]
+        else:
+            return [launcher, "--show-stats", "--stats-format", "json"]
+
+    def parse_stats(self, data: bytes):
+        """Parse stats output into a dict of ``hits`` and ``misses`` counters."""
+        try:
+            if self.name == "ccache":
+                counters = {}
+                for line in data.decode("utf-8").splitlines():
+                    key, _, value = line.partition("\t")
+                    if value.strip().isdigit():
+                        counters[key] = int(value)
+
+                return {
+                    "hits": counters.get("direct_cache_hit", 0)
+                    + counters.get("preprocessed_cache_hit", 0),
+                    "misses": counters.get("cache_miss", 0),
+                }
+            else:
+                stats = json.loads(data)["stats"]
+
+                return {
+                    "hits": sum(stats["cache_hits"]["counts"].values()),
+                    "misses": sum(stats["cache_misses"]["counts"].values()),
+                }
+        except (ValueError, KeyError):
+            log("unable to parse %s statistics" % self.name)
+            return None
+
+    def record_stats(self, before, after):
+        """Record the statistics delta of a build environment."""
+        if before is None or after is None:
+            return
+
+        # Statistics are global to the cache. Concurrent builds sharing the
+        # cache directory will perturb the delta.
+        stats = {
+            "program": self.name,
+            "hits": max(after["hits"] - before["hits"], 0),
+            "misses": max(after["misses"] - before["misses"], 0),
+        }
+
+        log(
+            "%s: %d cache hits, %d cache misses"
+            % (self.name, stats["hits"], stats["misses"])
+        )
+
+        self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.stats_path.open("w") as fh:
+            json.dump(stats, fh, sort_keys=True, indent=4)
+
+
+class ConfigureCache(object):
+    """Autoconf cache files (``config.cache``) reused between builds.
+
+    ``path`` holds a directory of cache files per key, which identifies the
+    inputs affecting configure results (target, toolchain, flags and package
+    versions). A ``CONFIG_SITE`` script selects the cache file within it by
+    the configure script's package and its arguments and compiler settings,
+    so differently configured runs never share results.
+    """
+
+    SITE = b"""# Generated by build.py. Selects a cache file for this configure run.
+if test -n "$PYBUILD_CONFIGURE_CACHE_DIR" && test "$cache_file" = /dev/null; then
+    mkdir -p "$PYBUILD_CONFIGURE_CACHE_DIR"
+    cache_file="$PYBUILD_CONFIGURE_CACHE_DIR/$(printf '%s\\n' \\
+        "$PACKAGE_NAME" "$PACKAGE_VERSION" "$ac_configure_args" \\
+        "$CC" "$CFLAGS" "$CPPFLAGS" "$CXX" "$CXXFLAGS" "$LDFLAGS" "$LIBS" \\
+        | cksum | cut -d' ' -f1).cache"
+fi
+"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        write_if_different(self.path / "config.site", self.SITE)
+
+    def environment(self, site_dir: str, cache_dir: str, key: str):
+        """Environment variables enabling the cache for configure runs.
+
+        ``site_dir`` is where the cache directory is visible to the build and
+        ``cache_dir`` the writable directory holding cache files.
+        """
+        return {
+            "CONFIG_SITE": "%s/config.site" % site_dir,
+            "PYBUILD_CONFIGURE_CACHE_DIR": "%s/%s" % (cache_dir, key),
+        }
+
 
 class ContainerContext(object):
-    def __init__(self, container):
+    def __init__(
+        self, container, compiler_cache=None, configure_cache=None, jobserver=False
+    ):
         self.container = container
+        self.compiler_cache = compiler_cache
+        self.configure_cache = configure_cache
+        self.jobserver = jobserver
+        self.compiler_cache_stats = None
 
         self.tools_path = "/tools"
 
@@ -53,14 +247,14 @@ class ContainerContext(object):
         self.run(["/bin/tar", "-C", "/tools", "-xf", "/build/%s" % p.name])
 
     def install_artifact_archive(
-        self, build_dir, package_name, target_triple, build_options
+        self, build_dir, package_name, target_triple, build_options, python_version=None
     ):
         entry = DOWNLOADS[package_name]
         basename = "%s-%s-%s-%s.tar" % (
             package_name,
             entry["version"],
             target_triple,
-            build_options,
+            dependency_variant(build_options, package_name, python_version),
         )
 
         p = build_dir / basename
@@ -86,16 +280,85 @@ class ContainerContext(object):
                 build_dir, clang_toolchain(host_platform, target_triple), host_platform
             )
 
+            if self.compiler_cache:
+                self.install_compiler_cache()
+
         if musl:
             self.install_toolchain_archive(
                 build_dir, "musl-static" if static else "musl", host_platform
             )
 
+    def install_compiler_cache(self):
+        """Route the clang toolchain's compiler drivers through the cache."""
+        cache = self.compiler_cache
+        cache_path = "/tools/compiler-cache"
+        launcher = "%s/%s" % (cache_path, cache.name)
+
+        self.run(["/bin/mkdir", "-p", "%s/real" % cache_path])
+        self.copy_file(cache.launcher, cache_path)
+
+        # Drivers like clang++ are symlinks to clang, so resolve them all
+        # before any is replaced by a wrapper. Keep the driver name so clang
+        # infers the correct driver mode.
+        for compiler in cache.COMPILERS:
+            self.run(
+                [
+                    "/bin/sh",
+                    "-c",
+                    'ln -s "$(readlink -f /tools/llvm/bin/%s)" %s/real/%s'
+                    % (compiler, cache_path, compiler),
+                ]
+            )
+
+        for compiler in cache.COMPILERS:
+            path = "/tools/llvm/bin/%s" % compiler
+            real = "%s/real/%s" % (cache_path, compiler)
+
+            self.run(["/bin/rm", path])
+
+            with tempfile.NamedTemporaryFile("wb") as fh:
+                os.chmod(fh.name, 0o755)
+                fh.write(
+                    cache.wrapper(launcher, real, CONTAINER_COMPILER_CACHE, "/build")
+                )
+                fh.flush()
+
+                self.copy_file(
+                    pathlib.Path(fh.name), "/tools/llvm/bin", dest_name=compiler
+                )
+
+        self.compiler_cache_stats = self.get_compiler_cache_stats()
+
+    def get_compiler_cache_stats(self):
+        cache = self.compiler_cache
+        exit_code, output = self.container.exec_run(
+            cache.stats_args("/tools/compiler-cache/%s" % cache.name),
+            user="build",
+            environment=cache.environment(CONTAINER_COMPILER_CACHE, "/build"),
+        )
+
+        return cache.parse_stats(output) if exit_code == 0 else None
+
+    def configure_cache_environment(self, key: str):
+        if not self.configure_cache:
+            return {}
+
+        return self.configure_cache.environment(
+            "/configure-cache", CONTAINER_CONFIGURE_CACHE, key
+        )
+
     def run(self, program, user="build", environment=None):
         if isinstance(program, str) and not program.startswith("/"):
             program = "/build/%s" % program
 
-        container_exec(self.container, program, user=user, environment=environment)
+        span = os.path.basename(program if isinstance(program, str) else program[0])
+
+        # Build scripts participate in the jobserver.
+        if isinstance(program, str) and self.jobserver:
+            program = jobserver_command([program], CONTAINER_JOBSERVER_PATH)
+
+        with profile_span(span):
+            container_exec(self.container, program, user=user, environment=environment)
 
     def get_tools_archive(self, dest, name):
         log("copying container files to %s" % dest)
@@ -114,7 +377,7 @@ class ContainerContext(object):
 
         raise Exception("file not found")
 
-    def get_output_archive(self, path=None, as_tar=False):
+    def get_output_archive(self, path=None, as_tar=False, manifest=False):
         p = "/build/out"
         if path:
             p += "/%s" % path
@@ -122,7 +385,7 @@ class ContainerContext(object):
         data = container_get_archive(self.container, p)
         data = io.BytesIO(data)
 
-        data = normalize_tar_archive(data)
+        data = normalize_tar_archive(data, manifest=manifest)
 
         if as_tar:
             return tarfile.open(fileobj=data)
@@ -132,7 +395,10 @@ class ContainerContext(object):
     def find_output_files(self, base_path, pattern):
         command = ["/usr/bin/find", "/build/out/%s" % base_path, "-name", pattern]
 
-        for line in self.container.exec_run(command, user="build")[1].splitlines():
+        # Only read stdout, so errors (e.g. a missing directory) aren't files.
+        stdout, _ = self.container.exec_run(command, user="build", demux=True)[1]
+
+        for line in (stdout or b"").splitlines():
             if not line.strip():
                 continue
 
@@ -140,8 +406,11 @@ class ContainerContext(object):
 
 
 class TempdirContext(object):
-    def __init__(self, td):
+    def __init__(self, td, compiler_cache=None, jobserver=None):
         self.td = pathlib.Path(td)
+        self.compiler_cache = compiler_cache
+        self.jobserver = jobserver
+        self.compiler_cache_stats = None
 
         self.tools_path = str(self.td / "tools")
 
@@ -177,14 +446,14 @@ class TempdirContext(object):
         extract_tar_to_directory(p, dest_path)
 
     def install_artifact_archive(
-        self, build_dir, package_name, target_triple, build_options
+        self, build_dir, package_name, target_triple, build_options, python_version=None
     ):
         entry = DOWNLOADS[package_name]
         basename = "%s-%s-%s-%s.tar" % (
             package_name,
             entry["version"],
             target_triple,
-            build_options,
+            dependency_variant(build_options, package_name, python_version),
         )
 
         p = build_dir / basename
@@ -210,11 +479,65 @@ class TempdirContext(object):
                 build_dir, clang_toolchain(platform, target_triple), platform
             )
 
+            if self.compiler_cache:
+                self.install_compiler_cache()
+
         if musl:
             self.install_toolchain_archive(
                 build_dir, "musl-static" if static else "musl", platform
             )
 
+    def install_compiler_cache(self):
+        """Route the clang toolchain's compiler drivers through the cache."""
+        cache = self.compiler_cache
+        real_dir = self.td / "tools" / "compiler-cache" / "real"
+        real_dir.mkdir(parents=True, exist_ok=True)
+
+        bin_dir = self.td / "tools" / "llvm" / "bin"
+
+        # Drivers like clang++ are symlinks to clang, so resolve them all
+        # before any is replaced by a wrapper. Keep the driver name so clang
+        # infers the correct driver mode.
+        for compiler in cache.COMPILERS:
+            (real_dir / compiler).symlink_to((bin_dir / compiler).resolve())
+
+        for compiler in cache.COMPILERS:
+            path = bin_dir / compiler
+            real = real_dir / compiler
+
+            log("routing %s through %s" % (path, cache.name))
+
+            path.unlink()
+
+            with path.open("wb") as fh:
+                fh.write(
+                    cache.wrapper(
+                        str(cache.launcher),
+                        str(real),
+                        str(cache.cache_dir),
+                        str(self.td),
+                    )
+                )
+            path.chmod(0o755)
+
+        self.compiler_cache_stats = self.get_compiler_cache_stats()
+
+    def get_compiler_cache_stats(self):
+        cache = self.compiler_cache
+        env = dict(os.environ)
+        env.update(cache.environment(str(cache.cache_dir), str(self.td)))
+
+        res = subprocess.run(
+            cache.stats_args(str(cache.launcher)), env=env, capture_output=True
+        )
+
+        return cache.parse_stats(res.stdout) if res.returncode == 0 else None
+
+    def configure_cache_environment(self, key: str):
+        # Paths in temporary directories differ between builds and end up in
+        # configure results. So the cache is only used in containers.
+        return {}
+
     def run(self, program, user="build", environment=None):
         if user != "build":
             raise Exception("cannot change user in temp directory builds")
@@ -222,7 +545,14 @@ class TempdirContext(object):
         if isinstance(program, str) and not program.startswith("/"):
             program = str(self.td / program)
 
-        exec_and_log(program, cwd=self.td, env=environment)
+        span = os.path.basename(program if isinstance(program, str) else program[0])
+
+        # Build scripts participate in the jobserver.
+        if isinstance(program, str) and self.jobserver:
+            program = jobserver_command([program], self.jobserver)
+
+        with profile_span(span):
+            exec_and_log(program, cwd=self.td, env=environment)
 
     def get_tools_archive(self, dest, name):
         log("copying built files to %s" % dest)
@@ -237,14 +567,14 @@ class TempdirContext(object):
         with p.open("rb") as fh:
             return fh.read()
 
-    def get_output_archive(self, path, as_tar=False):
+    def get_output_archive(self, path, as_tar=False, manifest=False):
         p = self.td / "out" / path
 
         data = io.BytesIO()
         create_tar_from_directory(data, p, path_prefix=p.parts[-1])
         data.seek(0)
 
-        data = normalize_tar_archive(data)
+        data = normalize_tar_archive(data, manifest=manifest)
 
         if as_tar:
             return tarfile.open(fileobj=data)
@@ -264,23 +594,108 @@ class TempdirContext(object):
 
 
 @contextlib.contextmanager
-def build_environment(client, image):
+def build_environment(client, image, source_tree=None):
+    """Create an environment to build in.
+
+    ``source_tree`` is a host directory mounted into container build
+    environments, under its name in the build directory. Builds in it persist
+    after the environment is torn down.
+    """
+    compiler_cache = COMPILER_CACHE[0]
+    configure_cache = CONFIGURE_CACHE[0]
+    jobserver = os.environ.get("PYBUILD_JOBSERVER")
+
     if client is not None:
-        container = client.containers.run(
-            image, command=["/bin/sleep", "86400"], detach=True
-        )
-        td = None
-        context = ContainerContext(container)
+        volumes = {}
+        if compiler_cache:
+            volumes[str(compiler_cache.cache_dir)] = {
+                "bind": "/compiler-cache",
+                "mode": "rw",
+            }
+        if configure_cache:
+            volumes[str(configure_cache.path)] = {
+                "bind": "/configure-cache",
+                "mode": "rw",
+            }
+        if jobserver:
+            volumes[jobserver] = {"bind": CONTAINER_JOBSERVER_PATH, "mode": "rw"}
+        if source_tree:
+            volumes[str(source_tree)] = {
+                "bind": "/build/%s" % source_tree.name,
+                "mode": "rw",
+            }
+
+        with profile_span("container setup"):
+            container = client.containers.run(
+                image,
+                command=["/bin/sleep", "86400"],
+                detach=True,
+                volumes=volumes,
+                mem_reservation=CONTAINER_MEMORY_RESERVATION[0],
+            )
+            td = None
+            context = ContainerContext(
+                container,
+                compiler_cache=compiler_cache,
+                configure_cache=configure_cache,
+                jobserver=bool(jobserver),
+            )
+
+            # Let the build user write to the mounted host directories, without
+            # changing their owner on the host.
+            if compiler_cache:
+                context.run(["/bin/mkdir", "-p", CONTAINER_COMPILER_CACHE], user="root")
+                context.run(
+                    ["/bin/chown", "build:build", CONTAINER_COMPILER_CACHE],
+                    user="root",
+                )
+            if configure_cache:
+                context.run(
+                    ["/bin/mkdir", "-p", CONTAINER_CONFIGURE_CACHE], user="root"
+                )
+                context.run(
+                    ["/bin/chown", "build:build", CONTAINER_CONFIGURE_CACHE],
+                    user="root",
+                )
+            # The source tree is shared with the host, which syncs into and
+            # removes files from it. So everyone may write to it.
+            if source_tree:
+                context.run(
+                    ["/bin/chmod", "-R", "a+rwX", "/build/%s" % source_tree.name],
+                    user="root",
+                )
     else:
+        if source_tree:
+            raise Exception("source trees are only supported in containers")
+
         container = None
         td = tempfile.TemporaryDirectory()
-        context = TempdirContext(td.name)
+        context = TempdirContext(
+            td.name, compiler_cache=compiler_cache, jobserver=jobserver
+        )
+
+    add_profile_build_environment()
 
     try:
         yield context
+
+        if compiler_cache and context.compiler_cache_stats is not None:
+            compiler_cache.record_stats(
+                context.compiler_cache_stats, context.get_compiler_cache_stats()
+            )
     finally:
         if container:
-            container.stop(timeout=0)
-            container.remove()
+            with profile_span("container teardown"):
+                # Processes in the container aren't our children. So their
+                # resource usage has to be obtained from Docker.
+                if profile_active():
+                    add_profile_usage(*container_resource_usage(container))
+                if source_tree:
+                    container.exec_run(
+                        ["/bin/chmod", "-R", "a+rwX", "/build/%s" % source_tree.name],
+                        user="root",
+                    )
+                container.stop(timeout=0)
+                container.remove()
         else:
             td.cleanup()
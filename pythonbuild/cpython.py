@@ -2,14 +2,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import functools
+import hashlib
+import io
+import json
+import os
 import pathlib
 import re
+import shutil
 import tarfile
 
-import jsonschema
-import yaml
-
 from pythonbuild.logging import log
+from pythonbuild.utils import CONFIG_CACHE, hash_path
 
 EXTENSION_MODULE_SCHEMA = {
     "type": "object",
@@ -237,14 +241,298 @@ def meets_python_maximum_version(got: str, wanted: str) -> bool:
     return (got_major, got_minor) <= (wanted_major, wanted_minor)
 
 
+def python_version_tuple(version: str) -> tuple[int, int]:
+    parts = version.split(".")
+    return int(parts[0]), int(parts[1])
+
+
+@functools.lru_cache(maxsize=None)
+def target_triple_regex(patterns: tuple[str, ...]) -> re.Pattern:
+    """Compile target triple patterns into a single regular expression.
+
+    The expression matches a triple if any of the patterns matches at its
+    start, as ``re.match()`` does.
+    """
+    return re.compile("|".join("(?:%s)" % p for p in patterns))
+
+
+class ExtensionModuleResolver:
+    """Resolves extension module metadata for a build configuration.
+
+    The metadata is compiled once, when first needed: version bounds are
+    parsed and target patterns are compiled to regular expressions. Resolved
+    metadata is indexed by Python minor version, target triple and build
+    mode. With a ``cache_dir``, it is also persisted there as JSON, keyed by
+    ``cache_key``, so other processes resolving the same build configuration
+    skip resolution.
+    """
+
+    def __init__(self, extension_modules, cache_dir=None, cache_key=None):
+        self.extension_modules = extension_modules
+        self.cache_dir = cache_dir
+        self.cache_key = cache_key
+        self._index = {}
+
+    @functools.cached_property
+    def _modules(self):
+        modules = {}
+
+        for name, info in sorted(self.extension_modules.items()):
+            if info.get("build-mode") not in (None, "shared", "static"):
+                raise Exception("unsupported build-mode for extension module %s" % name)
+
+            modules[name] = {
+                "versions": self._compile_versions(info),
+                "disabled-targets": self._compile_targets(info.get("disabled-targets")),
+                "conditionals": {
+                    key: [
+                        (
+                            entry,
+                            self._compile_versions(entry),
+                            self._compile_targets(entry.get("targets")),
+                        )
+                        for entry in info.get(key, [])
+                    ]
+                    for key in (
+                        "setup-enabled-conditional",
+                        "config-c-only-conditional",
+                        "sources-conditional",
+                        "defines-conditional",
+                        "includes-conditional",
+                        "links-conditional",
+                        "linker-args",
+                    )
+                },
+            }
+
+        return modules
+
+    @staticmethod
+    def _compile_versions(entry):
+        return (
+            python_version_tuple(entry.get("minimum-python-version", "1.0")),
+            python_version_tuple(entry.get("maximum-python-version", "100.0")),
+        )
+
+    @staticmethod
+    def _compile_targets(patterns):
+        return target_triple_regex(tuple(patterns)) if patterns else None
+
+    def resolve(self, python_version: str, target_triple: str, build_options):
+        """Resolve the metadata of all extension modules for a build.
+
+        Returns a dict of extension name to resolved metadata. Extensions not
+        supported by the Python version have status ``ignored``. Extensions
+        unavailable on the target have status ``disabled``.
+        """
+        version = python_version_tuple(python_version)
+        build_mode = "static" if "static" in build_options else None
+        key = (version, target_triple, build_mode)
+
+        if key in self._index:
+            return self._index[key]
+
+        cache_path = None
+        resolved = None
+
+        if self.cache_dir:
+            cache_path = self.cache_dir / (
+                "%d.%d-%s-%s.json" % (*version, target_triple, build_mode or "default")
+            )
+
+            try:
+                with cache_path.open("rb") as fh:
+                    cached = json.load(fh)
+            except (OSError, ValueError):
+                cached = None
+
+            if cached and cached["key"] == self.cache_key:
+                resolved = cached["resolved"]
+
+        if resolved is None:
+            resolved = {
+                name: self._resolve_module(name, version, target_triple, build_mode)
+                for name in self._modules
+            }
+
+            if cache_path:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                temp_path = cache_path.with_name(
+                    "%s.%d.tmp" % (cache_path.name, os.getpid())
+                )
+                with temp_path.open("w") as fh:
+                    json.dump({"key": self.cache_key, "resolved": resolved}, fh)
+                temp_path.replace(cache_path)
+
+        self._index[key] = resolved
+
+        return resolved
+
+    def _resolve_module(self, name, version, target_triple, build_mode):
+        info = self.extension_modules[name]
+        compiled = self._modules[name]
+
+        def version_match(versions):
+            return versions[0] <= version <= versions[1]
+
+        def matches(key):
+            for entry, versions, targets in compiled["conditionals"][key]:
+                if (targets is None or targets.match(target_triple)) and version_match(
+                    versions
+                ):
+                    yield entry
+
+        if not version_match(compiled["versions"]):
+            return {"status": "ignored"}
+
+        disabled = compiled["disabled-targets"]
+        section = build_mode or info.get("build-mode", "static")
+
+        resolved = {
+            "status": "disabled"
+            if disabled and disabled.match(target_triple)
+            else "enabled",
+            "build-mode": section,
+            "setup-enabled": info.get("setup-enabled", False)
+            or any(
+                entry.get("enabled", False)
+                for entry in matches("setup-enabled-conditional")
+            ),
+            "config-c-only": bool(info.get("config-c-only"))
+            or any(
+                entry.get("config-c-only", False)
+                for entry in matches("config-c-only-conditional")
+            ),
+            "sourceless": "sources" not in info and "sources-conditional" not in info,
+            "sources": list(info.get("sources", [])),
+            "defines": list(info.get("defines", [])),
+            "includes": list(info.get("includes", [])),
+            "links": list(info.get("links", [])),
+            "frameworks": [],
+            "linker-args": [],
+        }
+
+        for entry in matches("sources-conditional"):
+            if entry.get("build-mode") not in (None, section):
+                continue
+
+            if source := entry.get("source"):
+                resolved["sources"].append(source)
+            resolved["sources"].extend(entry.get("sources", []))
+
+        for entry in matches("defines-conditional"):
+            resolved["defines"].append(entry["define"])
+
+        for entry in matches("includes-conditional"):
+            # TODO: Change to `include` and drop support for `path`
+            if include := entry.get("path"):
+                resolved["includes"].append(include)
+            resolved["includes"].extend(entry.get("includes", []))
+
+        # Includes are added to global search path.
+        if "-apple-" not in target_triple:
+            for path in info.get("includes-deps", []):
+                resolved["includes"].append(f"/tools/deps/{path}")
+
+        for entry in matches("links-conditional"):
+            resolved["links"].append(entry["name"])
+
+        if "-apple-" in target_triple:
+            resolved["frameworks"].extend(info.get("frameworks", []))
+
+        for entry in matches("linker-args"):
+            resolved["linker-args"].extend(entry["args"])
+
+        return resolved
+
+
+# Files of the CPython source distribution declaring extension modules.
+SOURCE_METADATA_FILES = (
+    "Modules/Setup",
+    "Modules/Setup.bootstrap.in",
+    "Modules/config.c.in",
+)
+
+
+def source_metadata_files(cpython_source: pathlib.Path, python_version: str):
+    """Obtain the files of a CPython source tree declaring extension modules.
+
+    ``cpython_source`` is a source directory or archive. Decompressing an
+    archive is slow, so its files are extracted once and cached, keyed by the
+    archive's hash.
+
+    Returns a dict of path in the source tree to content. Files that don't
+    exist in the source tree are absent.
+    """
+    if cpython_source.is_dir():
+        source_dir = cpython_source
+    else:
+        source_dir = CONFIG_CACHE / "cpython-source" / hash_path(cpython_source)
+
+        if not source_dir.is_dir():
+            prefix = "Python-%s/" % python_version
+            temp_dir = source_dir.with_name(
+                "%s.%d.tmp" % (source_dir.name, os.getpid())
+            )
+            remaining = set(SOURCE_METADATA_FILES)
+
+            with tarfile.open(str(cpython_source)) as tf:
+                for member in tf:
+                    name = member.name.removeprefix(prefix)
+                    if name not in remaining:
+                        continue
+
+                    ifh = tf.extractfile(member)
+                    if not ifh:
+                        continue
+
+                    dest = temp_dir / name
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    dest.write_bytes(ifh.read())
+
+                    remaining.remove(name)
+                    if not remaining:
+                        break
+
+            # Don't cache the files of a version not matching the archive.
+            # Modules/Setup.bootstrap.in only exists in 3.11+.
+            if remaining - {"Modules/Setup.bootstrap.in"}:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise Exception(
+                    "%s does not contain %s"
+                    % (
+                        cpython_source,
+                        ", ".join(prefix + name for name in sorted(remaining)),
+                    )
+                )
+
+            temp_dir.mkdir(parents=True, exist_ok=True)
+
+            try:
+                temp_dir.rename(source_dir)
+            except OSError:
+                # Extracted concurrently by another build.
+                shutil.rmtree(temp_dir)
+
+    return {
+        name: (source_dir / name).read_bytes()
+        for name in SOURCE_METADATA_FILES
+        if (source_dir / name).is_file()
+    }
+
+
 def derive_setup_local(
-    cpython_source_archive,
+    cpython_source,
     python_version,
     target_triple,
     build_options,
-    extension_modules,
+    resolver,
 ):
-    """Derive the content of the Modules/Setup.local file."""
+    """Derive the content of the Modules/Setup.local file.
+
+    ``cpython_source`` is the CPython source archive or directory.
+    ``resolver`` resolves the extension modules metadata.
+    """
 
     # The first part of this function validates that our extension modules YAML
     # based metadata is in sync with the various files declaring extension
@@ -255,77 +543,39 @@ def derive_setup_local(
     setup_enabled_wanted = set()
     config_c_only_wanted = set()
 
+    extension_modules = resolver.extension_modules
+    resolved_modules = resolver.resolve(python_version, target_triple, build_options)
+
     # Collect metadata about our extension modules as they relate to this
     # Python target.
-    for name, info in sorted(extension_modules.items()):
-        python_min_match = meets_python_minimum_version(
-            python_version, info.get("minimum-python-version", "1.0")
-        )
-        python_max_match = meets_python_maximum_version(
-            python_version, info.get("maximum-python-version", "100.0")
-        )
-
-        if info.get("build-mode") not in (None, "shared", "static"):
-            raise Exception("unsupported build-mode for extension module %s" % name)
-
-        if not (python_min_match and python_max_match):
+    for name, resolved in sorted(resolved_modules.items()):
+        if resolved["status"] == "ignored":
             log(f"ignoring extension module {name} because Python version incompatible")
             ignored.add(name)
             continue
 
-        if targets := info.get("disabled-targets"):
-            if any(re.match(p, target_triple) for p in targets):
-                log(
-                    "disabling extension module %s because disabled for this target triple"
-                    % name
-                )
-                disabled.add(name)
-
-        if info.get("setup-enabled", False):
-            setup_enabled_wanted.add(name)
-
-        for entry in info.get("setup-enabled-conditional", []):
-            python_min_match_setup = meets_python_minimum_version(
-                python_version, entry.get("minimum-python-version", "1.0")
-            )
-            python_max_match_setup = meets_python_maximum_version(
-                python_version, entry.get("maximum-python-version", "100.0")
+        if resolved["status"] == "disabled":
+            log(
+                "disabling extension module %s because disabled for this target triple"
+                % name
             )
+            disabled.add(name)
 
-            if entry.get("enabled", False) and (
-                python_min_match_setup and python_max_match_setup
-            ):
-                setup_enabled_wanted.add(name)
+        if resolved["setup-enabled"]:
+            setup_enabled_wanted.add(name)
 
-        if info.get("config-c-only"):
+        if resolved["config-c-only"]:
             config_c_only_wanted.add(name)
 
-        for entry in info.get("config-c-only-conditional", []):
-            python_min_match_setup = meets_python_minimum_version(
-                python_version, entry.get("minimum-python-version", "1.0")
-            )
-            python_max_match_setup = meets_python_maximum_version(
-                python_version, entry.get("maximum-python-version", "100.0")
-            )
-            if entry.get("config-c-only", False) and (
-                python_min_match_setup and python_max_match_setup
-            ):
-                config_c_only_wanted.add(name)
-
     # Parse more files in the distribution for their metadata.
 
-    with tarfile.open(str(cpython_source_archive)) as tf:
-        ifh = tf.extractfile("Python-%s/Modules/Setup" % python_version)
-        setup_lines = ifh.readlines()
-
-        try:
-            ifh = tf.extractfile(f"Python-{python_version}/Modules/Setup.bootstrap.in")
-            setup_bootstrap_in = ifh.readlines()
-        except KeyError:
-            setup_bootstrap_in = []
+    source_files = source_metadata_files(pathlib.Path(cpython_source), python_version)
 
-        ifh = tf.extractfile("Python-%s/Modules/config.c.in" % python_version)
-        config_c_in = ifh.read()
+    setup_lines = io.BytesIO(source_files["Modules/Setup"]).readlines()
+    setup_bootstrap_in = io.BytesIO(
+        source_files.get("Modules/Setup.bootstrap.in", b"")
+    ).readlines()
+    config_c_in = source_files["Modules/config.c.in"]
 
     dist_modules = set()
     setup_enabled_actual = set()
@@ -493,17 +743,14 @@ def derive_setup_local(
             enabled_extensions[name]["setup_line"] = name.encode("ascii")
             continue
 
-        # Force static linking if we're doing a fully static build, otherwise,
-        # respect the `build-mode` falling back to `static` if not defined.
-        section = (
-            "static" if "static" in build_options else info.get("build-mode", "static")
-        )
+        resolved = resolved_modules[name]
+        section = resolved["build-mode"]
         enabled_extensions[name]["build-mode"] = section
 
         # Presumably this means the extension comes from the distribution's
         # Setup. Lack of sources means we don't need to derive a Setup.local
         # line.
-        if "sources" not in info and "sources-conditional" not in info:
+        if resolved["sourceless"]:
             if name not in setup_enabled_lines:
                 raise Exception(
                     f"found a sourceless extension ({name}) with no Setup entry"
@@ -518,116 +765,15 @@ def derive_setup_local(
 
         log(f"extension {name} being configured via YAML metadata")
 
-        line = name
-
-        for source in info.get("sources", []):
-            line += " %s" % source
-
-        for entry in info.get("sources-conditional", []):
-            if targets := entry.get("targets", []):
-                target_match = any(re.match(p, target_triple) for p in targets)
-            else:
-                target_match = True
-
-            python_min_match = meets_python_minimum_version(
-                python_version, entry.get("minimum-python-version", "1.0")
-            )
-            python_max_match = meets_python_maximum_version(
-                python_version, entry.get("maximum-python-version", "100.0")
-            )
-
-            if build_mode := entry.get("build-mode"):
-                build_mode_match = section == build_mode
-            else:
-                build_mode_match = True
-
-            if (
-                target_match
-                and python_min_match
-                and python_max_match
-                and build_mode_match
-            ):
-                if source := entry.get("source"):
-                    line += f" {source}"
-                for source in entry.get("sources", []):
-                    line += f" {source}"
-
-        for define in info.get("defines", []):
-            line += f" -D{define}"
-
-        for entry in info.get("defines-conditional", []):
-            if targets := entry.get("targets", []):
-                target_match = any(re.match(p, target_triple) for p in targets)
-            else:
-                target_match = True
-
-            python_min_match = meets_python_minimum_version(
-                python_version, entry.get("minimum-python-version", "1.0")
-            )
-            python_max_match = meets_python_maximum_version(
-                python_version, entry.get("maximum-python-version", "100.0")
-            )
-
-            if target_match and (python_min_match and python_max_match):
-                line += f" -D{entry['define']}"
-
-        for path in info.get("includes", []):
-            line += f" -I{path}"
-
-        for entry in info.get("includes-conditional", []):
-            if targets := entry.get("targets", []):
-                target_match = any(re.match(p, target_triple) for p in targets)
-            else:
-                target_match = True
-
-            python_min_match = meets_python_minimum_version(
-                python_version, entry.get("minimum-python-version", "1.0")
-            )
-            python_max_match = meets_python_maximum_version(
-                python_version, entry.get("maximum-python-version", "100.0")
-            )
-
-            if target_match and (python_min_match and python_max_match):
-                # TODO: Change to `include` and drop support for `path`
-                if include := entry.get("path"):
-                    line += f" -I{include}"
-                for include in entry.get("includes", []):
-                    line += f" -I{include}"
-
-        for path in info.get("includes-deps", []):
-            # Includes are added to global search path.
-            if "-apple-" in target_triple:
-                continue
-
-            line += f" -I/tools/deps/{path}"
-
-        for lib in info.get("links", []):
-            line += " %s" % link_for_target(lib, target_triple)
-
-        for entry in info.get("links-conditional", []):
-            if targets := entry.get("targets", []):
-                target_match = any(re.match(p, target_triple) for p in targets)
-            else:
-                target_match = True
-
-            python_min_match = meets_python_minimum_version(
-                python_version, entry.get("minimum-python-version", "1.0")
-            )
-            python_max_match = meets_python_maximum_version(
-                python_version, entry.get("maximum-python-version", "100.0")
-            )
-
-            if target_match and (python_min_match and python_max_match):
-                line += " %s" % link_for_target(entry["name"], target_triple)
-
-        if "-apple-" in target_triple:
-            for framework in info.get("frameworks", []):
-                line += f" -framework {framework}"
-
-        for entry in info.get("linker-args", []):
-            if any(re.match(p, target_triple) for p in entry["targets"]):
-                for arg in entry["args"]:
-                    line += f" -Xlinker {arg}"
+        line = " ".join(
+            [name]
+            + resolved["sources"]
+            + ["-D%s" % define for define in resolved["defines"]]
+            + ["-I%s" % path for path in resolved["includes"]]
+            + [link_for_target(lib, target_triple) for lib in resolved["links"]]
+            + ["-framework %s" % framework for framework in resolved["frameworks"]]
+            + ["-Xlinker %s" % arg for arg in resolved["linker-args"]]
+        )
 
         line = line.encode("ascii")
 
@@ -718,11 +864,70 @@ def parse_config_c(s: str):
     return extensions
 
 
+# Loaded extension-modules.yml files and their resolvers, keyed by path.
+EXTENSION_MODULES: dict[str, tuple] = {}
+
+
 def extension_modules_config(yaml_path: pathlib.Path):
-    """Loads the extension-modules.yml file."""
-    with yaml_path.open("r", encoding="utf-8") as fh:
-        data = yaml.load(fh, Loader=yaml.SafeLoader)
+    """Loads the extension-modules.yml file.
+
+    The validated content is cached on disk, keyed by the hashes of the file
+    and of the schema, so loads after the first skip YAML parsing and schema
+    validation. It is also memoized for the lifetime of the process.
+    """
+    return load_extension_modules(yaml_path)[1]
+
+
+def extension_module_resolver(yaml_path: pathlib.Path):
+    """Obtain the resolver of the extension-modules.yml file.
+
+    The resolver is built once per content of the file. It persists its
+    resolutions next to the cached config.
+    """
+    return load_extension_modules(yaml_path)[2]
+
+
+def load_extension_modules(yaml_path: pathlib.Path):
+    """Obtain the key, content and resolver of an extension-modules.yml file."""
+    path = os.path.abspath(yaml_path)
+    key = [
+        hash_path(yaml_path),
+        hashlib.sha256(
+            json.dumps(EXTENSION_MODULES_SCHEMA, sort_keys=True).encode("utf-8")
+        ).hexdigest(),
+    ]
+
+    if path in EXTENSION_MODULES and EXTENSION_MODULES[path][0] == key:
+        return EXTENSION_MODULES[path]
+
+    cache_path = CONFIG_CACHE / ("%s.json" % yaml_path.name)
+
+    try:
+        with cache_path.open("rb") as fh:
+            cached = json.load(fh)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached and cached["key"] == key:
+        data = cached["extension_modules"]
+    else:
+        import jsonschema
+        import yaml
+
+        with yaml_path.open("r", encoding="utf-8") as fh:
+            data = yaml.load(fh, Loader=yaml.SafeLoader)
+
+        jsonschema.validate(data, EXTENSION_MODULES_SCHEMA)
+
+        CONFIG_CACHE.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_name("%s.%d.tmp" % (cache_path.name, os.getpid()))
+        with temp_path.open("w") as fh:
+            json.dump({"key": key, "extension_modules": data}, fh)
+        temp_path.replace(cache_path)
 
-    jsonschema.validate(data, EXTENSION_MODULES_SCHEMA)
+    resolver = ExtensionModuleResolver(
+        data, CONFIG_CACHE / ("%s.resolved" % yaml_path.name), key
+    )
+    EXTENSION_MODULES[path] = (key, data, resolver)
 
-    return data
+    return EXTENSION_MODULES[path]
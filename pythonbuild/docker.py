@@ -9,14 +9,13 @@ import os
 import pathlib
 import tarfile
 
-import docker  # type: ignore
-import jinja2
-
 from .logging import log, log_raw
 from .utils import write_if_different
 
 
 def write_dockerfiles(source_dir: pathlib.Path, dest_dir: pathlib.Path):
+    import jinja2
+
     env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(source_dir)))
 
     for f in os.listdir(source_dir):
@@ -74,6 +73,8 @@ def get_image(
     if client is None:
         return None
 
+    import docker  # type: ignore
+
     image_name = f"image-{name}.{host_platform}"
     image_path = image_dir / image_name
     tar_path = image_path.with_suffix(".tar")
@@ -150,6 +151,28 @@ def container_exec(container, command, user="build", environment=None):
         raise Exception("exit code %d from %s" % (inspect_res["ExitCode"], command))
 
 
+def container_resource_usage(container):
+    """Obtain the CPU seconds and peak memory usage of a running container.
+
+    Peak memory usage is ``None`` if it can't be determined.
+    """
+    stats = container.stats(stream=False, one_shot=True)
+
+    cpu_seconds = stats.get("cpu_stats", {}).get("cpu_usage", {}).get("total_usage")
+    peak = stats.get("memory_stats", {}).get("max_usage")
+
+    # Docker only reports peak usage on cgroup v1. On cgroup v2 (Linux 5.19+),
+    # the container can read it from its own cgroup.
+    if peak is None:
+        exit_code, output = container.exec_run(
+            ["/bin/cat", "/sys/fs/cgroup/memory.peak"]
+        )
+        if exit_code == 0 and output.strip().isdigit():
+            peak = int(output)
+
+    return (cpu_seconds or 0) / 1e9, peak
+
+
 # 2019-01-01T00:00:00
 DEFAULT_MTIME = 1546329600
 
@@ -0,0 +1,77 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""A GNU make compatible jobserver shared by all build processes.
+
+The jobserver is a FIFO holding one byte per job token. Since a FIFO is
+addressed by path, it can be shared with processes that don't descend from
+the process creating it, including processes running in Docker containers
+that have the FIFO bind mounted.
+
+Each build action holds a single token while it runs. Build scripts see the
+FIFO on a well-known file descriptor and ``MAKE_JOBS_FLAGS`` pointing at it,
+so parallel ``make`` invocations within draw additional tokens from the same
+pool.
+"""
+
+import contextlib
+import os
+import pathlib
+
+# Path of the jobserver FIFO in build containers.
+CONTAINER_JOBSERVER_PATH = "/jobserver"
+
+# File descriptor build scripts have the jobserver FIFO opened as.
+JOBSERVER_FD = 3
+
+
+@contextlib.contextmanager
+def jobserver(path: pathlib.Path, tokens: int):
+    """Create a jobserver FIFO holding ``tokens`` job tokens."""
+    path.unlink(missing_ok=True)
+    os.mkfifo(path)
+    # Container builds run as a different user.
+    os.chmod(path, 0o666)
+
+    # Data in a FIFO is discarded once nothing has it open. So we keep it
+    # open for the lifetime of the jobserver.
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.write(fd, b"+" * tokens)
+        yield
+    finally:
+        os.close(fd)
+        path.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def jobserver_token(path: pathlib.Path):
+    """Hold a job token for the duration of the context."""
+    fd = os.open(path, os.O_RDWR)
+    try:
+        token = os.read(fd, 1)
+        try:
+            yield
+        finally:
+            os.write(fd, token)
+    finally:
+        os.close(fd)
+
+
+def jobserver_make_flags() -> str:
+    """Arguments making ``make`` a client of the jobserver."""
+    # --jobserver-fds is understood by all versions of make we encounter.
+    # Newer versions treat it as an alias of --jobserver-auth. Passing -j
+    # as well would make newer versions ignore the jobserver.
+    return "--jobserver-fds=%d,%d" % (JOBSERVER_FD, JOBSERVER_FD)
+
+
+def jobserver_command(program: list[str], path: str) -> list[str]:
+    """Wrap a command so it runs with the jobserver FIFO opened."""
+    return [
+        "/bin/sh",
+        "-c",
+        'exec %d<>"$0" && exec "$@"' % JOBSERVER_FD,
+        path,
+    ] + program
@@ -0,0 +1,178 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Memory-aware admission of build actions.
+
+Build actions reserve their expected peak memory usage against a budget
+shared by all build processes before running, so concurrent builds don't
+exhaust the host's memory. Expected usage is learned from the highest peak
+memory usage previous runs of an action recorded.
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import pathlib
+import time
+
+from .logging import log
+
+GIB = 1024 * 1024 * 1024
+
+# Learned estimates are scaled by this, to absorb variance between runs.
+ESTIMATE_HEADROOM = 1.25
+
+
+def host_memory() -> int:
+    """Obtain the amount of physical memory of this machine, in bytes."""
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def parse_memory_size(value: str) -> int:
+    """Parse a size like ``512M`` or ``16G`` to bytes."""
+    units = {"K": 1024, "M": 1024 * 1024, "G": GIB}
+
+    value = value.strip().upper()
+    if value[-1:] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+
+    return int(value)
+
+
+def memory_estimate_key(action: str, build_options: str, pgo=None) -> str:
+    """Obtain the key estimates of an action's memory usage are stored under.
+
+    ``pgo`` identifies the PGO training run of CPython builds, whose memory
+    usage depends on its workload and number of jobs.
+    """
+    # Only CPython's memory usage depends meaningfully on build options.
+    if action.startswith("cpython-") and not action.endswith("-host"):
+        if pgo:
+            return "%s:%s:%s" % (action, build_options, pgo)
+
+        return "%s:%s" % (action, build_options)
+
+    return action
+
+
+def default_memory_estimate(action: str, build_options: str) -> int:
+    """Estimate the memory usage of an action we haven't seen run before."""
+    if action.startswith("cpython-") and not action.endswith("-host"):
+        # LTO links and PGO training runs are the most memory hungry steps.
+        if "lto" in build_options:
+            return 8 * GIB
+        elif "pgo" in build_options:
+            return 4 * GIB
+        else:
+            return 2 * GIB
+
+    return 1 * GIB
+
+
+@contextlib.contextmanager
+def _locked_json(path: pathlib.Path):
+    """Read-modify-write a JSON object while holding an exclusive lock."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+
+        fh.seek(0)
+        data = fh.read()
+        value = json.loads(data) if data else {}
+
+        yield value
+
+        fh.seek(0)
+        fh.truncate()
+        json.dump(value, fh, indent=4, sort_keys=True)
+
+
+def memory_estimate(path: pathlib.Path, action: str, build_options: str, pgo=None):
+    """Resolve the expected peak memory usage of an action.
+
+    Returns the estimate in bytes and whether it was learned from a previous
+    run.
+    """
+    key = memory_estimate_key(action, build_options, pgo)
+
+    try:
+        with path.open("rb") as fh:
+            estimates = json.load(fh)
+    except (OSError, ValueError):
+        estimates = {}
+
+    if key in estimates:
+        return int(estimates[key] * ESTIMATE_HEADROOM), True
+
+    return default_memory_estimate(action, build_options), False
+
+
+def record_memory_usage(
+    path: pathlib.Path, action: str, build_options: str, peak: int, pgo=None
+):
+    """Record the observed peak memory usage of an action.
+
+    The highest peak of all runs is kept, as runs served partially from
+    caches (e.g. compiler caches or cached PGO profiles) use less memory than
+    a cold build will.
+    """
+    key = memory_estimate_key(action, build_options, pgo)
+
+    with _locked_json(path) as estimates:
+        estimates[key] = max(estimates.get(key, 0), peak)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+@contextlib.contextmanager
+def memory_reservation(path: pathlib.Path, budget: int, amount: int):
+    """Reserve memory against a budget shared by all build processes.
+
+    Reservations are recorded in a JSON file keyed by process ID, so those of
+    processes that died without releasing them can be reclaimed. An action
+    is always admitted when nothing else holds a reservation, even if it
+    exceeds the budget.
+    """
+    pid = str(os.getpid())
+    waiting = False
+
+    while True:
+        with _locked_json(path) as reservations:
+            for other in list(reservations):
+                if not _pid_alive(int(other)):
+                    del reservations[other]
+
+            reserved = sum(reservations.values())
+
+            if not reservations or reserved + amount <= budget:
+                reservations[pid] = amount
+                break
+
+        if not waiting:
+            log(
+                "waiting for %.1f GiB of memory (%.1f of %.1f GiB reserved)"
+                % (amount / GIB, reserved / GIB, budget / GIB)
+            )
+            waiting = True
+
+        time.sleep(1)
+
+    log("reserved %.1f GiB of memory" % (amount / GIB))
+
+    try:
+        yield
+    finally:
+        with _locked_json(path) as reservations:
+            reservations.pop(pid, None)
@@ -0,0 +1,280 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Timing and resource usage profiles of build actions.
+
+Each build action records a profile to a JSON file. Once a build completes,
+the profiles are merged into a Chrome trace (viewable in Perfetto or
+``chrome://tracing``) and a report of the critical path through the
+dependency graph.
+"""
+
+import contextlib
+import json
+import pathlib
+import resource
+import sys
+import time
+from typing import Optional
+
+PROFILE: list[Optional["ActionProfile"]] = [None]
+
+
+def set_action_profile(profile):
+    """Register the ``ActionProfile`` spans should be recorded on."""
+    PROFILE[0] = profile
+
+
+def profile_active() -> bool:
+    return PROFILE[0] is not None
+
+
+def _maxrss_bytes(ru: resource.struct_rusage) -> int:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return ru.ru_maxrss if sys.platform == "darwin" else ru.ru_maxrss * 1024
+
+
+class ActionProfile(object):
+    """Records the timing and resource usage of a build action.
+
+    ``output`` is the path of the file the action produces and ``depends``
+    the paths of its prerequisites. They link profiles into the dependency
+    graph.
+    """
+
+    def __init__(
+        self, name: str, output: str, depends: list[str], thread: bool = False
+    ):
+        self.name = name
+        self.output = output
+        self.depends = depends
+        self.spans: list[dict] = []
+        self.cpu_seconds = 0.0
+        self.peak_rss = 0
+        self.build_environments = 0
+
+        # Actions running on a thread alongside others only account the
+        # resource usage of that thread.
+        if thread:
+            who = [getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)]
+        else:
+            who = [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]
+
+        self.start = time.time()
+        self._rusage = [(w, resource.getrusage(w)) for w in who]
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.spans.append({"name": name, "start": start, "end": time.time()})
+
+    def add_usage(self, cpu_seconds: float, peak_rss):
+        """Account resources used outside of our process tree (e.g. containers)."""
+        self.cpu_seconds += cpu_seconds
+        if peak_rss:
+            self.peak_rss = max(self.peak_rss, peak_rss)
+
+    def write(self, path: pathlib.Path):
+        """Write the profile to ``path``.
+
+        Returns the peak memory usage of the action's build environments, or
+        None if it didn't run any, e.g. because its output was cached.
+        """
+        end = time.time()
+
+        cpu_seconds = self.cpu_seconds
+        peak_rss = self.peak_rss
+        build_peak_rss = self.peak_rss
+
+        for who, before in self._rusage:
+            after = resource.getrusage(who)
+            cpu_seconds += (after.ru_utime - before.ru_utime) + (
+                after.ru_stime - before.ru_stime
+            )
+
+            # The peak RSS of children is a high-water mark over all children
+            # ever waited for. So it only tells us something if it rose
+            # during the action. Our own peak RSS isn't the build's.
+            if who != resource.RUSAGE_CHILDREN:
+                peak_rss = max(peak_rss, _maxrss_bytes(after))
+            elif after.ru_maxrss > before.ru_maxrss:
+                peak_rss = max(peak_rss, _maxrss_bytes(after))
+                build_peak_rss = max(build_peak_rss, _maxrss_bytes(after))
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as fh:
+            json.dump(
+                {
+                    "name": self.name,
+                    "output": self.output,
+                    "depends": self.depends,
+                    "start": self.start,
+                    "end": end,
+                    "cpu_seconds": cpu_seconds,
+                    "peak_rss": peak_rss,
+                    "spans": self.spans,
+                },
+                fh,
+                sort_keys=True,
+                indent=4,
+            )
+
+        return build_peak_rss if self.build_environments else None
+
+
+@contextlib.contextmanager
+def profile_span(name: str):
+    """Record a span on the registered action profile, if any."""
+    if PROFILE[0] is None:
+        yield
+    else:
+        with PROFILE[0].span(name):
+            yield
+
+
+def add_profile_usage(cpu_seconds: float, peak_rss):
+    """Account resource usage on the registered action profile, if any."""
+    if PROFILE[0] is not None:
+        PROFILE[0].add_usage(cpu_seconds, peak_rss)
+
+
+def add_profile_build_environment():
+    """Record that the registered action profile, if any, ran a build."""
+    if PROFILE[0] is not None:
+        PROFILE[0].build_environments += 1
+
+
+def load_profiles(profile_dir: pathlib.Path) -> list[dict]:
+    profiles = []
+
+    for p in sorted(profile_dir.glob("*.json")):
+        with p.open("rb") as fh:
+            profiles.append(json.load(fh))
+
+    return sorted(profiles, key=lambda p: p["start"])
+
+
+def critical_path(profiles: list[dict]) -> list[dict]:
+    """Resolve the chain of actions that determined the build's duration.
+
+    Starting from the action finishing last, we repeatedly walk to the
+    prerequisite built in this run that finished last, as that is the one
+    gating the start of the action.
+    """
+    if not profiles:
+        return []
+
+    by_output = {p["output"]: p for p in profiles}
+
+    node = max(profiles, key=lambda p: p["end"])
+    path = [node]
+
+    while True:
+        preds = [by_output[d] for d in node["depends"] if d in by_output]
+        if not preds:
+            break
+
+        node = max(preds, key=lambda p: p["end"])
+        path.append(node)
+
+    return list(reversed(path))
+
+
+def format_critical_path(profiles: list[dict]) -> str:
+    path = critical_path(profiles)
+    if not path:
+        return "no build actions were profiled\n"
+
+    begin = min(p["start"] for p in profiles)
+    end = max(p["end"] for p in profiles)
+
+    lines = [
+        "build took %.1fs; critical path of %d actions:" % (end - begin, len(path)),
+        "",
+        "%10s %10s %10s %10s  %s" % ("start", "wait", "duration", "cpu", "action"),
+    ]
+
+    previous_end = begin
+    for p in path:
+        lines.append(
+            "%9.1fs %9.1fs %9.1fs %9.1fs  %s"
+            % (
+                p["start"] - begin,
+                p["start"] - previous_end,
+                p["end"] - p["start"],
+                p["cpu_seconds"],
+                p["name"],
+            )
+        )
+        for span in p["spans"]:
+            lines.append(
+                "%31.1fs %13s  %s" % (span["end"] - span["start"], "", span["name"])
+            )
+
+        previous_end = p["end"]
+
+    lines.append("")
+
+    return "\n".join(lines)
+
+
+def write_chrome_trace(profiles: list[dict], path: pathlib.Path):
+    """Write profiles in the Chrome trace event format."""
+    if not profiles:
+        return
+
+    begin = min(p["start"] for p in profiles)
+    on_critical_path = {p["output"] for p in critical_path(profiles)}
+
+    def us(t):
+        return int((t - begin) * 1000000)
+
+    # Assign each action to a lane (thread) not occupied at its start time.
+    lanes: list[float] = []
+    events = []
+
+    for p in profiles:
+        for tid, lane_end in enumerate(lanes):
+            if lane_end <= p["start"]:
+                lanes[tid] = p["end"]
+                break
+        else:
+            tid = len(lanes)
+            lanes.append(p["end"])
+
+        events.append(
+            {
+                "name": p["name"],
+                "cat": "critical" if p["output"] in on_critical_path else "action",
+                "ph": "X",
+                "pid": 1,
+                "tid": tid,
+                "ts": us(p["start"]),
+                "dur": us(p["end"]) - us(p["start"]),
+                "args": {
+                    "output": p["output"],
+                    "cpu_seconds": p["cpu_seconds"],
+                    "peak_rss": p["peak_rss"],
+                },
+            }
+        )
+
+        for span in p["spans"]:
+            events.append(
+                {
+                    "name": span["name"],
+                    "cat": "span",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": tid,
+                    "ts": us(span["start"]),
+                    "dur": us(span["end"]) - us(span["start"]),
+                }
+            )
+
+    with path.open("w") as fh:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh, indent=1)
@@ -0,0 +1,280 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Interpreter startup and import time measurements of distributions.
+
+Cold runs pass ``-B``, so nothing they compile is kept. They reflect a fresh
+container or a read-only install, starting from the bytecode shipped in the
+distribution. Warm runs follow a run writing bytecode for everything they
+import. The OS page cache is warm in both cases.
+"""
+
+import json
+import statistics
+import subprocess
+import time
+
+from pythonbuild.benchmark import Distribution, summarize
+
+# Interpreter invocations whose startup is timed.
+STARTUP_COMMANDS = {
+    "python -c pass": ["-c", "pass"],
+    "python -I -S -c pass": ["-I", "-S", "-c", "pass"],
+}
+
+# Modules whose import is timed with ``-X importtime``.
+IMPORT_MODULES = ("ssl", "sqlite3", "asyncio", "json", "ctypes")
+
+# Number of imports with the highest self time recorded per module.
+IMPORT_BREAKDOWN_ENTRIES = 10
+
+
+def time_command(dist: Distribution, args: list[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([str(dist.python_exe), *args], capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def parse_importtime(output: str, module: str) -> dict:
+    """Parse ``-X importtime`` output of importing a module.
+
+    Returns the module's cumulative import time and the imports contributing
+    most self time to it, in microseconds.
+    """
+    imports = []
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        fields = line[len("import time:") :].split("|")
+        imports.append((fields[2].rstrip(), int(fields[0]), int(fields[1])))
+
+    # Imports are printed when they complete, nested imports before their
+    # parent and indented further. Top level imports are indented by 1 space.
+    cumulative = 0
+    breakdown = []
+    start = 0
+    for i, (name, _, cumulative_us) in enumerate(imports):
+        if name.startswith(" ") and not name.startswith("  "):
+            if name.strip() == module:
+                cumulative = cumulative_us
+                breakdown = imports[start : i + 1]
+            start = i + 1
+
+    breakdown = sorted(breakdown, key=lambda x: x[1], reverse=True)
+
+    return {
+        "cumulative_us": cumulative,
+        "breakdown": {
+            name.strip(): self_us
+            for name, self_us, _ in breakdown[:IMPORT_BREAKDOWN_ENTRIES]
+        },
+    }
+
+
+def time_import(dist: Distribution, module: str, cold: bool, runs: int) -> dict:
+    """Time importing a module, keeping the breakdown of the median run."""
+    results = []
+
+    for _ in range(runs):
+        res = subprocess.run(
+            [str(dist.python_exe), "-I"]
+            + (["-B"] if cold else [])
+            + ["-X", "importtime", "-c", "import %s" % module],
+            capture_output=True,
+            text=True,
+        )
+
+        if res.returncode:
+            return {"error": res.stderr.strip().splitlines()[-1]}
+
+        results.append(parse_importtime(res.stderr, module))
+
+    results.sort(key=lambda x: x["cumulative_us"])
+
+    return results[len(results) // 2]
+
+
+def measure_startup(dist: Distribution, runs: int, import_runs: int) -> dict:
+    """Measure startup and import times of a distribution."""
+    report: dict = {
+        "version": 1,
+        "distribution": dist.describe(),
+        "startup": {name: {} for name in STARTUP_COMMANDS},
+        "imports": {module: {} for module in IMPORT_MODULES},
+    }
+
+    for mode in ("cold", "warm"):
+        cold = mode == "cold"
+
+        if not cold:
+            # Write bytecode for everything the warm runs import.
+            for args in STARTUP_COMMANDS.values():
+                time_command(dist, args)
+            for module in IMPORT_MODULES:
+                time_command(dist, ["-c", "import %s" % module])
+
+        for name, args in STARTUP_COMMANDS.items():
+            timings = [
+                time_command(dist, (["-B"] if cold else []) + args) for _ in range(runs)
+            ]
+
+            summary = summarize(timings)
+            summary["median"] = statistics.median(timings)
+            report["startup"][name][mode] = summary
+
+        for module in IMPORT_MODULES:
+            report["imports"][module][mode] = time_import(
+                dist, module, cold, import_runs
+            )
+
+    return report
+
+
+def startup_metrics(report: dict) -> dict[str, float]:
+    """Obtain the gated metrics of a report, in milliseconds."""
+    metrics = {}
+
+    for name, modes in report["startup"].items():
+        for mode, summary in modes.items():
+            metrics["%s (%s)" % (name, mode)] = summary["median"] * 1000.0
+
+    for module, modes in report["imports"].items():
+        for mode, result in modes.items():
+            if "cumulative_us" in result:
+                metrics["import %s (%s)" % (module, mode)] = (
+                    result["cumulative_us"] / 1000.0
+                )
+
+    return metrics
+
+
+def compare_startup(
+    baseline: dict, report: dict, max_regression: float, min_regression_ms: float
+) -> list[tuple[str, float, float, bool]]:
+    """Compare a report with a baseline.
+
+    Returns ``(metric, baseline_ms, ms, regressed)`` tuples. A metric
+    regressed if it grew by more than ``max_regression`` percent and by more
+    than ``min_regression_ms``.
+    """
+    base = startup_metrics(baseline)
+    rows = []
+
+    for metric, value in startup_metrics(report).items():
+        if metric not in base:
+            continue
+
+        delta = value - base[metric]
+        regressed = (
+            delta > min_regression_ms and delta > base[metric] * max_regression / 100.0
+        )
+        rows.append((metric, base[metric], value, regressed))
+
+    return rows
+
+
+def print_startup_report(report: dict, rows=None):
+    """Print the metrics of a report and their comparison with a baseline."""
+    if rows is None:
+        rows = [
+            (metric, None, value, False)
+            for metric, value in startup_metrics(report).items()
+        ]
+
+    if rows and rows[0][1] is not None:
+        print("%-40s %13s %13s %9s" % ("", "baseline", "current", "change"))
+
+    for metric, base, value, regressed in rows:
+        if base is None:
+            print("%-40s %10.2f ms" % (metric, value))
+        else:
+            print(
+                "%-40s %10.2f ms %10.2f ms %+8.1f%%%s"
+                % (
+                    metric,
+                    base,
+                    value,
+                    (value - base) / base * 100.0 if base else 0.0,
+                    "  REGRESSION" if regressed else "",
+                )
+            )
+
+    for module, modes in report["imports"].items():
+        for mode, result in modes.items():
+            if "error" in result:
+                print("import %s (%s) failed: %s" % (module, mode, result["error"]))
+
+
+def add_startup_arguments(parser):
+    """Register the arguments of ``run_startup_gate()``."""
+    parser.add_argument(
+        "--startup-baseline",
+        help="Startup report to compare with; regressions fail the check",
+    )
+    parser.add_argument("--startup-output", help="Path to write the startup report to")
+    parser.add_argument(
+        "--startup-runs",
+        type=int,
+        default=20,
+        help="Number of timed runs of each startup command",
+    )
+    parser.add_argument(
+        "--import-runs",
+        type=int,
+        default=5,
+        help="Number of timed runs of each import",
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=10.0,
+        help="Percentage a metric may grow by relative to the baseline",
+    )
+    parser.add_argument(
+        "--min-regression-ms",
+        type=float,
+        default=1.0,
+        help="Milliseconds a metric may grow by regardless of --max-regression",
+    )
+
+
+def run_startup_gate(dist: Distribution, args) -> int:
+    """Measure a distribution's startup and compare it with a baseline.
+
+    Returns 1 if a metric regressed.
+    """
+    report = measure_startup(dist, args.startup_runs, args.import_runs)
+
+    if args.startup_output:
+        with open(args.startup_output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if not args.startup_baseline:
+        print_startup_report(report)
+        return 0
+
+    with open(args.startup_baseline, "rb") as fh:
+        baseline = json.load(fh)
+
+    rows = compare_startup(
+        baseline, report, args.max_regression, args.min_regression_ms
+    )
+    print_startup_report(report, rows)
+
+    regressions = [row[0] for row in rows if row[3]]
+    if regressions:
+        print(
+            "%d metrics regressed by more than %.1f%% and %.1f ms: %s"
+            % (
+                len(regressions),
+                args.max_regression,
+                args.min_regression_ms,
+                ", ".join(regressions),
+            )
+        )
+        return 1
+
+    return 0
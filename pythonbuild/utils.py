@@ -3,6 +3,7 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import collections
+import fnmatch
 import gzip
 import hashlib
 import http.client
@@ -13,20 +14,20 @@ import os
 import pathlib
 import platform
 import random
+import shutil
 import stat
 import string
 import subprocess
 import sys
 import tarfile
+import threading
 import time
 import urllib.error
 import urllib.request
 import zipfile
 
-import yaml
-import zstandard
-
 from .downloads import DOWNLOADS
+from .jobserver import jobserver_make_flags
 from .logging import log
 
 
@@ -69,10 +70,60 @@ def default_target_triple() -> str:
         raise Exception(f"unrecognized host platform: {host}")
 
 
+# Where compiled copies of YAML configuration files are cached.
+CONFIG_CACHE = pathlib.Path(os.path.abspath(__file__)).parent.parent / "build" / "cache"
+
+# Parsed targets YAML files, keyed by path.
+TARGETS: dict[str, tuple] = {}
+
+
 def get_targets(yaml_path: pathlib.Path):
-    """Obtain the parsed targets YAML file."""
-    with yaml_path.open("rb") as fh:
-        return yaml.load(fh, Loader=yaml.SafeLoader)
+    """Obtain the parsed targets YAML file.
+
+    The parsed file is memoized for the lifetime of the process. A compiled
+    JSON copy is also cached on disk, keyed by the YAML file's mtime and size,
+    as every make invocation spawns processes needing it and parsing YAML is
+    slow.
+    """
+    path = os.path.abspath(yaml_path)
+    st = yaml_path.stat()
+    key = [path, st.st_mtime_ns, st.st_size]
+
+    if path in TARGETS and TARGETS[path][0] == key:
+        return TARGETS[path][1]
+
+    cache_path = CONFIG_CACHE / ("%s.json" % yaml_path.name)
+
+    try:
+        with cache_path.open("rb") as fh:
+            cached = json.load(fh)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached and cached["key"] == key:
+        targets = cached["targets"]
+    else:
+        import yaml
+
+        with yaml_path.open("rb") as fh:
+            targets = yaml.load(
+                fh, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            )
+
+        # Only cache what survives a round trip through JSON.
+        data = json.dumps({"key": key, "targets": targets})
+        if json.loads(data)["targets"] == targets:
+            CONFIG_CACHE.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_name(
+                "%s.%d.tmp" % (cache_path.name, os.getpid())
+            )
+            with temp_path.open("w") as fh:
+                fh.write(data)
+            temp_path.replace(cache_path)
+
+    TARGETS[path] = (key, targets)
+
+    return targets
 
 
 def get_target_settings(yaml_path: pathlib.Path, target: str):
@@ -96,6 +147,32 @@ def supported_targets(yaml_path: pathlib.Path):
     return targets
 
 
+# Dependencies built with a host Python, directly or through another one of
+# them. Their archives are specific to the host Python's X.Y version.
+HOST_PYTHON_DEPENDENCIES = {"libX11", "libxcb", "tk", "xcb-proto"}
+
+
+def dependency_variant(
+    build_options: str, package_name=None, python_version=None
+) -> str:
+    """Resolve the variant of dependency archives used by a set of build options.
+
+    Dependencies are only sensitive to whether they are built for static
+    linking. So builds whose options otherwise differ share them. Those
+    built with a host Python are additionally specific to its X.Y version,
+    which is the version being built.
+    """
+    variant = "static" if "static" in build_options.split("+") else "shared"
+
+    if package_name in HOST_PYTHON_DEPENDENCIES:
+        if not python_version:
+            raise Exception("%s requires a host Python version" % package_name)
+
+        variant += "-" + ".".join(python_version.split(".")[0:2])
+
+    return variant
+
+
 def target_needs(yaml_path: pathlib.Path, target: str, python_version: str):
     """Obtain the dependencies needed to build the specified target."""
     settings = get_targets(yaml_path)[target]
@@ -141,6 +218,22 @@ def hash_path(p: pathlib.Path):
     return h.hexdigest()
 
 
+def hash_directory(p: pathlib.Path):
+    """Hash the relative paths, modes and content of files in a directory."""
+    h = hashlib.sha256()
+
+    for root, dirs, files in os.walk(p):
+        dirs.sort()
+
+        for f in sorted(files):
+            full = pathlib.Path(root) / f
+            h.update(full.relative_to(p).as_posix().encode("utf-8") + b"\0")
+            h.update(b"%o\0" % (full.stat().st_mode & 0o777))
+            h.update(hash_path(full).encode("ascii"))
+
+    return h.hexdigest()
+
+
 def get_target_support_file(
     search_dir, prefix, python_version, host_platform, target_triple
 ):
@@ -401,16 +494,156 @@ def extract_zip_to_directory(source: pathlib.Path, dest: pathlib.Path):
         zf.extractall(dest)
 
 
+def read_ignore_patterns(path: pathlib.Path):
+    """Read the patterns of a ``.gitignore`` file.
+
+    Negated patterns are not supported and are skipped.
+    """
+    if not path.exists():
+        return []
+
+    patterns = []
+
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+
+        if not line or line.startswith(("#", "!")):
+            continue
+
+        patterns.append(line)
+
+    return patterns
+
+
+def is_ignored(rel_path: str, is_dir: bool, patterns) -> bool:
+    """Whether a path relative to a tree's root matches ``.gitignore`` patterns."""
+    name = rel_path.rsplit("/", 1)[-1]
+
+    for pattern in patterns:
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+
+        # Patterns containing a slash are relative to the root.
+        if "/" in pattern:
+            if fnmatch.fnmatchcase(rel_path, pattern.lstrip("/")):
+                return True
+        elif fnmatch.fnmatchcase(name, pattern):
+            return True
+
+    return False
+
+
+def sync_directory(
+    source: pathlib.Path, dest: pathlib.Path, manifest_path: pathlib.Path, excludes=()
+):
+    """Incrementally mirror the files of a directory into another.
+
+    Files are compared by modification time and size against a manifest of
+    the previous sync, so only new and changed files are copied. Files
+    removed from ``source`` since the previous sync are removed from
+    ``dest``. Other files in ``dest``, e.g. build products, are kept.
+
+    Paths matching ``excludes`` or the patterns of ``source``'s
+    ``.gitignore`` are not synced.
+
+    Returns the sorted relative paths of copied and removed files.
+    """
+    try:
+        with manifest_path.open("rb") as fh:
+            previous = json.load(fh)
+    except (OSError, ValueError):
+        previous = {}
+
+    patterns = list(excludes) + read_ignore_patterns(source / ".gitignore")
+
+    current = {}
+    changed = []
+
+    for root, dirs, files in os.walk(source):
+        rel_root = pathlib.Path(root).relative_to(source).as_posix()
+        prefix = "" if rel_root == "." else rel_root + "/"
+
+        # Symlinks to directories are synced as links.
+        files.extend(d for d in dirs if os.path.islink(os.path.join(root, d)))
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not os.path.islink(os.path.join(root, d))
+            and not is_ignored(prefix + d, True, patterns)
+        )
+
+        for f in sorted(files):
+            rel = prefix + f
+            if is_ignored(rel, False, patterns):
+                continue
+
+            st = os.lstat(os.path.join(root, f))
+            current[rel] = [st.st_mtime_ns, st.st_size]
+
+            dest_path = dest / rel
+            if previous.get(rel) == current[rel] and os.path.lexists(dest_path):
+                continue
+
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            if os.path.lexists(dest_path):
+                dest_path.unlink()
+            shutil.copy2(os.path.join(root, f), dest_path, follow_symlinks=False)
+            changed.append(rel)
+
+    for rel in sorted(set(previous) - set(current)):
+        (dest / rel).unlink(missing_ok=True)
+        changed.append(rel)
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = manifest_path.with_name("%s.%d.tmp" % (manifest_path.name, os.getpid()))
+    with temp_path.open("w") as fh:
+        json.dump(current, fh)
+    temp_path.replace(manifest_path)
+
+    return sorted(changed)
+
+
 # 2024-01-01T00:00:00Z
 DEFAULT_MTIME = 1704067200
 
 
-def normalize_tar_archive(data: io.BytesIO) -> io.BytesIO:
+def archive_manifest(members) -> bytes:
+    """Derive the content of a ``MANIFEST.json`` describing archive members.
+
+    ``members`` are ``(TarInfo, data)`` tuples, as ``normalize_tar_archive()``
+    collects them. Directories are not listed.
+    """
+    files = []
+
+    for ti, filedata in members:
+        if ti.isdir():
+            continue
+
+        entry = {"path": ti.name, "size": ti.size, "mode": ti.mode & 0o7777}
+
+        if ti.issym() or ti.islnk():
+            entry["link"] = ti.linkname
+        elif filedata is not None:
+            entry["sha256"] = hashlib.sha256(filedata.getvalue()).hexdigest()
+
+        files.append(entry)
+
+    return json.dumps(
+        {"version": "1", "files": files}, sort_keys=True, indent=4
+    ).encode("utf-8")
+
+
+def normalize_tar_archive(data: io.BytesIO, manifest=False) -> io.BytesIO:
     """Normalize the contents of a tar archive.
 
     We want tar archives to be as deterministic as possible. This function will
     take tar archive data in a buffer and return a new buffer containing a more
     deterministic tar archive.
+
+    If ``manifest`` is true, a ``python/MANIFEST.json`` listing the path,
+    size, mode and SHA-256 of every member is added after ``PYTHON.json``.
     """
     members = []
 
@@ -465,6 +698,19 @@ def normalize_tar_archive(data: io.BytesIO) -> io.BytesIO:
         if ti.mode & stat.S_IXUSR:
             ti.mode |= stat.S_IXGRP
 
+    if manifest:
+        manifest_data = archive_manifest(members)
+
+        ti = tarfile.TarInfo("python/MANIFEST.json")
+        ti.size = len(manifest_data)
+        ti.mode = 0o664
+        ti.mtime = DEFAULT_MTIME
+        ti.uname = "root"
+        ti.gname = "root"
+
+        index = 1 if members and members[0][0].name == "python/PYTHON.json" else 0
+        members.insert(index, (ti, io.BytesIO(manifest_data)))
+
     dest = io.BytesIO()
     with tarfile.open(fileobj=dest, mode="w") as tf:
         for ti, filedata in members:
@@ -492,9 +738,141 @@ def clang_toolchain(host_platform: str, target_triple: str) -> str:
         raise Exception("unhandled host platform")
 
 
+def compiler_cache_key(host_platform: str, target_triple: str) -> str:
+    """Resolve the compiler cache directory name for a toolchain.
+
+    Cached objects are only valid for the exact toolchain that produced them,
+    so the key incorporates the hash of the clang toolchain archive.
+    """
+    entry = clang_toolchain(host_platform, target_triple)
+    sha256 = DOWNLOADS[entry]["sha256"]
+
+    assert isinstance(sha256, str)
+
+    return "%s-%s" % (entry, sha256[0:16])
+
+
+def compiler_cache_summary(stats_dir: pathlib.Path):
+    """Print a summary of compiler cache statistics recorded by builds."""
+    if not stats_dir.is_dir():
+        return
+
+    total_hits = 0
+    total_misses = 0
+
+    print("compiler cache statistics:")
+
+    for p in sorted(stats_dir.glob("*.json")):
+        with p.open("rb") as fh:
+            stats = json.load(fh)
+
+        total_hits += stats["hits"]
+        total_misses += stats["misses"]
+
+        print("  %s: %d hits, %d misses" % (p.stem, stats["hits"], stats["misses"]))
+
+    total = total_hits + total_misses
+    print(
+        "  total: %d hits, %d misses (%.1f%% hit rate)"
+        % (total_hits, total_misses, 100.0 * total_hits / total if total else 0.0)
+    )
+
+
+# PYTHON.json keys copied into entries of the distribution index.
+DIST_INDEX_PYTHON_KEYS = (
+    "build_options",
+    "crt_features",
+    "libpython_link_mode",
+    "python_extension_module_loading",
+    "python_tag",
+    "python_version",
+    "target_triple",
+)
+
+# Serializes updates to the distribution index by concurrent compressions.
+DIST_INDEX_LOCK = threading.Lock()
+
+
+def python_archive_metadata(source_path: pathlib.Path, dest_path: pathlib.Path):
+    """Describe a compressed distribution archive.
+
+    ``source_path`` is the uncompressed tar ``dest_path`` was compressed from.
+    It is read instead of decompressing ``dest_path``.
+    """
+    members = 0
+    directory_sizes: collections.Counter[str] = collections.Counter()
+    python_json = None
+
+    with tarfile.open(source_path, "r") as tf:
+        for ti in tf:
+            if ti.isdir():
+                continue
+
+            members += 1
+
+            # Sizes are grouped by directories within the python/ root.
+            parts = ti.name.split("/")
+            directory_sizes["/".join(parts[:2]) if len(parts) > 2 else parts[0]] += (
+                ti.size
+            )
+
+            if ti.name == "python/PYTHON.json" and (ifh := tf.extractfile(ti)):
+                python_json = json.load(ifh)
+
+    return {
+        "archive": dest_path.name,
+        "sha256": hash_path(dest_path),
+        "size": dest_path.stat().st_size,
+        "uncompressed_size": source_path.stat().st_size,
+        "members": members,
+        "directory_sizes": dict(sorted(directory_sizes.items())),
+        "python": python_json,
+    }
+
+
+def write_dist_index(dist_path: pathlib.Path):
+    """Write ``index.json`` describing all distribution archives in a directory.
+
+    The index is aggregated from the ``<basename>.json`` metadata files
+    written next to each archive.
+    """
+    archives = {}
+
+    for p in sorted(dist_path.glob("*.json")):
+        if p.name == "index.json":
+            continue
+
+        with p.open("rb") as fh:
+            metadata = json.load(fh)
+
+        if "archive" not in metadata or not (dist_path / metadata["archive"]).exists():
+            continue
+
+        entry = {k: v for k, v in metadata.items() if k not in ("archive", "python")}
+        entry["metadata"] = p.name
+        for k in DIST_INDEX_PYTHON_KEYS:
+            if k in (metadata["python"] or {}):
+                entry[k] = metadata["python"][k]
+
+        archives[metadata["archive"]] = entry
+
+    temp_path = dist_path / ("index.json.%d.tmp" % os.getpid())
+    with temp_path.open("w") as fh:
+        json.dump({"version": 1, "archives": archives}, fh, sort_keys=True, indent=2)
+    temp_path.replace(dist_path / "index.json")
+
+
 def compress_python_archive(
     source_path: pathlib.Path, dist_path: pathlib.Path, basename: str
 ):
+    """Compress a distribution archive into ``dist_path``.
+
+    ``<basename>.json``, describing the archive and holding its
+    ``PYTHON.json``, is written next to it and ``index.json`` is updated, so
+    consumers can inspect distributions without downloading them.
+    """
+    import zstandard
+
     dest_path = dist_path / ("%s.tar.zst" % basename)
     temp_path = dist_path / ("%s.tar.zst.tmp" % basename)
 
@@ -512,7 +890,15 @@ def compress_python_archive(
     finally:
         temp_path.unlink(missing_ok=True)
 
-    print("%s has SHA256 %s" % (dest_path, hash_path(dest_path)))
+    metadata = python_archive_metadata(source_path, dest_path)
+
+    print("%s has SHA256 %s" % (dest_path, metadata["sha256"]))
+
+    with DIST_INDEX_LOCK:
+        with (dist_path / ("%s.json" % basename)).open("w") as fh:
+            json.dump(metadata, fh, sort_keys=True, indent=2)
+
+        write_dist_index(dist_path)
 
     return dest_path
 
@@ -566,6 +952,13 @@ def add_env_common(env):
     env["NUM_CPUS"] = "%d" % cpu_count
     env["NUM_JOBS_AGGRESSIVE"] = "%d" % max(cpu_count + 2, cpu_count * 2)
 
+    # Parallel make invocations draw from the jobserver shared between builds
+    # if there is one. Otherwise they use every CPU.
+    if "PYBUILD_JOBSERVER" in os.environ:
+        env["MAKE_JOBS_FLAGS"] = jobserver_make_flags()
+    else:
+        env["MAKE_JOBS_FLAGS"] = "-j %d" % cpu_count
+
     if "CI" in os.environ:
         env["CI"] = "1"
 
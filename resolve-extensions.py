@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Print the extension module metadata resolved for a build configuration.
+
+Prints the sources, defines, includes and links of each extension module,
+as ``derive_setup_local()`` resolves them from ``extension-modules.yml``
+when building. e.g.::
+
+    resolve-extensions.py --python 3.13 \\
+        --target-triple x86_64-unknown-linux-gnu --extension _ssl
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+
+from pythonbuild.cpython import extension_module_resolver
+
+ROOT = pathlib.Path(os.path.abspath(__file__)).parent
+EXTENSION_MODULES = ROOT / "cpython-unix" / "extension-modules.yml"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--python", required=True, help="Python X.Y version to resolve for"
+    )
+    parser.add_argument(
+        "--target-triple", required=True, help="Target triple to resolve for"
+    )
+    parser.add_argument(
+        "--options", default="noopt", help="Build options, e.g. pgo+lto+static"
+    )
+    parser.add_argument(
+        "--extension",
+        action="append",
+        help="Only print the named extension (can be repeated)",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Also print extensions ignored for the Python version",
+    )
+
+    args = parser.parse_args()
+
+    resolver = extension_module_resolver(EXTENSION_MODULES)
+    resolved = resolver.resolve(
+        args.python, args.target_triple, set(args.options.split("+"))
+    )
+
+    if args.extension:
+        missing = set(args.extension) - set(resolved)
+        if missing:
+            print("unknown extension modules: %s" % ", ".join(sorted(missing)))
+            return 1
+
+        resolved = {name: resolved[name] for name in args.extension}
+    elif not args.all:
+        resolved = {
+            name: info for name, info in resolved.items() if info["status"] != "ignored"
+        }
+
+    json.dump(resolved, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -58,6 +58,22 @@ pub struct PythonBuildInfo {
     pub object_file_format: String,
 }
 
+#[derive(Debug, Deserialize)]
+#[serde(deny_unknown_fields)]
+#[allow(dead_code)]
+pub struct PgoWorkload {
+    pub mode: String,
+    pub sha256: String,
+}
+
+#[derive(Debug, Deserialize)]
+#[serde(deny_unknown_fields)]
+#[allow(dead_code)]
+pub struct PrecompiledBytecode {
+    pub invalidation_mode: String,
+    pub optimization_levels: Vec<u8>,
+}
+
 #[derive(Debug, Deserialize)]
 #[serde(deny_unknown_fields)]
 #[allow(dead_code)]
@@ -73,6 +89,8 @@ pub struct PythonJsonMain {
     pub licenses: Option<Vec<String>>,
     pub license_path: Option<String>,
     pub optimizations: String,
+    pub pgo_workload: Option<PgoWorkload>,
+    pub precompiled_bytecode: Option<PrecompiledBytecode>,
     pub python_abi_tag: Option<String>,
     pub python_bytecode_magic_number: String,
     pub python_config_vars: HashMap<String, String>,
@@ -118,3 +136,28 @@ pub fn parse_python_json(json_data: &[u8]) -> Result<PythonJsonMain> {
 
     Ok(v)
 }
+
+#[derive(Debug, Deserialize)]
+#[serde(deny_unknown_fields)]
+#[allow(dead_code)]
+pub struct ManifestEntry {
+    pub path: String,
+    pub size: u64,
+    pub mode: u32,
+    pub sha256: Option<String>,
+    pub link: Option<String>,
+}
+
+#[derive(Debug, Deserialize)]
+#[serde(deny_unknown_fields)]
+#[allow(dead_code)]
+pub struct PythonManifest {
+    pub version: String,
+    pub files: Vec<ManifestEntry>,
+}
+
+pub fn parse_python_manifest(json_data: &[u8]) -> Result<PythonManifest> {
+    let v: PythonManifest = serde_json::from_slice(json_data)?;
+
+    Ok(v)
+}
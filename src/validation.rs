@@ -21,8 +21,9 @@ use {
         },
     },
     once_cell::sync::Lazy,
+    sha2::{Digest, Sha256},
     std::{
-        collections::{BTreeSet, HashMap},
+        collections::{BTreeMap, BTreeSet, HashMap},
         convert::TryInto,
         io::Read,
         iter::FromIterator,
@@ -1808,6 +1809,46 @@ fn validate_json(json: &PythonJsonMain, triple: &str, is_debug: bool) -> Result<
     Ok(errors)
 }
 
+/// Verify an archive member against its `MANIFEST.json` entry.
+fn validate_manifest_entry(
+    manifest: &mut BTreeMap<String, ManifestEntry>,
+    path: &Path,
+    mode: u32,
+    data: &[u8],
+) -> Vec<String> {
+    let name = path.display().to_string();
+
+    let Some(entry) = manifest.remove(&name) else {
+        return vec![format!("{name} not in MANIFEST.json")];
+    };
+
+    let mut errors = vec![];
+
+    if entry.size != data.len() as u64 {
+        errors.push(format!(
+            "{name} has size {} but MANIFEST.json records {}",
+            data.len(),
+            entry.size
+        ));
+    }
+
+    if entry.mode != mode & 0o7777 {
+        errors.push(format!(
+            "{name} has mode {:o} but MANIFEST.json records {:o}",
+            mode & 0o7777,
+            entry.mode
+        ));
+    }
+
+    if let Some(sha256) = entry.sha256 {
+        if hex::encode(Sha256::digest(data)) != sha256 {
+            errors.push(format!("{name} SHA-256 does not match MANIFEST.json"));
+        }
+    }
+
+    errors
+}
+
 fn validate_distribution(
     dist_path: &Path,
     macos_sdks: Option<&IndexedSdks>,
@@ -1858,6 +1899,8 @@ fn validate_distribution(
 
     let mut wanted_python_paths = BTreeSet::new();
     let mut json = None;
+    let mut python_json_entry = None;
+    let mut manifest = None;
 
     let mut entry = entries.next().unwrap()?;
     if entry.path()?.display().to_string() == "python/PYTHON.json" {
@@ -1865,6 +1908,7 @@ fn validate_distribution(
 
         let mut data = Vec::new();
         entry.read_to_end(&mut data)?;
+        python_json_entry = Some((entry.header().mode()?, data.clone()));
         json = Some(parse_python_json(&data).context("parsing PYTHON.json")?);
         context
             .errors
@@ -1914,6 +1958,38 @@ fn validate_distribution(
         let mut data = Vec::new();
         entry.read_to_end(&mut data)?;
 
+        // The optional MANIFEST.json follows PYTHON.json and describes all
+        // members but directories.
+        if path == PathBuf::from("python/MANIFEST.json") {
+            let mut files = BTreeMap::from_iter(
+                parse_python_manifest(&data)
+                    .context("parsing MANIFEST.json")?
+                    .files
+                    .into_iter()
+                    .map(|entry| (entry.path.clone(), entry)),
+            );
+
+            if let Some((mode, python_json_data)) = &python_json_entry {
+                context.errors.extend(validate_manifest_entry(
+                    &mut files,
+                    Path::new("python/PYTHON.json"),
+                    *mode,
+                    python_json_data,
+                ));
+            }
+
+            manifest = Some(files);
+        } else if let (Some(files), false) =
+            (manifest.as_mut(), entry.header().entry_type().is_dir())
+        {
+            context.errors.extend(validate_manifest_entry(
+                files,
+                &path,
+                entry.header().mode()?,
+                &data,
+            ));
+        }
+
         context.merge(validate_possible_object_file(
             json.as_ref().unwrap(),
             python_major_minor,
@@ -2012,6 +2088,14 @@ fn validate_distribution(
 
     // We've now read the contents of the archive. Move on to analyzing the results.
 
+    if let Some(files) = manifest {
+        for path in files.keys() {
+            context
+                .errors
+                .push(format!("{path} in MANIFEST.json but not in archive"));
+        }
+    }
+
     for path in seen_symlink_targets {
         if !seen_paths.contains(&path) {
             context.errors.push(format!(
@@ -2204,6 +2288,16 @@ fn verify_distribution_behavior(dist_path: &Path) -> Result<Vec<String>> {
         .unchecked()
         .env("TARGET_TRIPLE", &python_json.target_triple)
         .env("BUILD_OPTIONS", &python_json.build_options)
+        .env(
+            "EXTENSION_MODULES",
+            python_json
+                .build_info
+                .extensions
+                .keys()
+                .cloned()
+                .collect::<Vec<_>>()
+                .join(" "),
+        )
         .run()
         .context(format!(
             "Failed to run `{} {}`",
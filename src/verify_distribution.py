@@ -172,6 +172,49 @@ class TestPythonInterpreter(unittest.TestCase):
 
         self.assertEqual(sysconfig.get_config_var("Py_GIL_DISABLED"), wanted)
 
+    @unittest.skipUnless(
+        "freethreaded" in os.environ.get("BUILD_OPTIONS", "").split("+"),
+        "GIL can only be disabled in free-threaded builds",
+    )
+    @unittest.skipIf("EXTENSION_MODULES" not in os.environ, "EXTENSION_MODULES not set")
+    def test_gil_stays_disabled(self):
+        import importlib
+        import warnings
+
+        self.assertFalse(sys._is_gil_enabled())
+
+        # Importing an extension module not declaring support for running
+        # without the GIL enables it. The modules are those the distribution
+        # declares in PYTHON.json.
+        import_errors = {}
+        gil_enabled_by = None
+
+        for name in sorted(os.environ["EXTENSION_MODULES"].split()):
+            # Test modules may deliberately lack support.
+            if name.startswith(("_test", "_ctypes_test", "_xx", "xx")):
+                continue
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                try:
+                    importlib.import_module(name)
+                except ImportError as e:
+                    import_errors[name] = str(e)
+                    continue
+
+            if sys._is_gil_enabled():
+                # Later imports can't be told apart once the GIL is enabled.
+                gil_enabled_by = name
+                break
+
+        with self.subTest("imports"):
+            self.assertEqual(import_errors, {}, "extension modules failed to import")
+
+        with self.subTest("gil"):
+            self.assertIsNone(
+                gil_enabled_by, "importing %s enabled the GIL" % gil_enabled_by
+            )
+
     @unittest.skipIf(
         sys.version_info[:2] < (3, 14),
         "zstd is only available in 3.14+",
@@ -3,47 +3,56 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
-"""Script to run Python tests from a distribution archive."""
+"""Script to run Python tests from a distribution archive.
 
-import json
+With ``--startup``, interpreter startup and import times are checked
+instead. e.g.::
+
+    test-distribution.py --startup --startup-baseline baseline.json \\
+        path/to/distribution.tar.zst
+"""
+
+import argparse
 import pathlib
 import subprocess
 import sys
-import tarfile
 import tempfile
 
-import zstandard
+from pythonbuild.benchmark import extract_distribution
+from pythonbuild.startup import add_startup_arguments, run_startup_gate
 
 
 def main(args):
-    if not args:
-        print("Usage: test-distribution.py path/to/distribution.tar.zst")
-        return 1
-
-    distribution_path = args[0]
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="Check startup and import times instead of running tests",
+    )
+    add_startup_arguments(parser)
+    parser.add_argument("distribution", help="Path to distribution archive")
+    parser.add_argument(
+        "test_args",
+        nargs=argparse.REMAINDER,
+        help="Arguments to the Python test harness",
+    )
+
+    args = parser.parse_args(args)
 
     with tempfile.TemporaryDirectory() as td:
-        td = pathlib.Path(td)
-
-        with open(distribution_path, "rb") as fh:
-            dctx = zstandard.ZstdDecompressor()
-            with dctx.stream_reader(fh) as reader:
-                with tarfile.open(mode="r|", fileobj=reader) as tf:
-                    tf.extractall(td)
-
-        root = td / "python"
-
-        python_json = root / "PYTHON.json"
+        dist = extract_distribution(
+            pathlib.Path(args.distribution), pathlib.Path(td) / "dist"
+        )
 
-        with python_json.open("rb") as fh:
-            info = json.load(fh)
+        if args.startup:
+            return run_startup_gate(dist, args)
 
         test_args = [
-            str(root / info["python_exe"]),
-            str(root / info["run_tests"]),
+            str(dist.python_exe),
+            str(dist.root / dist.info["run_tests"]),
         ]
 
-        test_args.extend(args[1:])
+        test_args.extend(args.test_args)
 
         return subprocess.run(test_args).returncode
 
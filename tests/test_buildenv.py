@@ -0,0 +1,52 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import collections
+
+from pythonbuild.buildenv import ContainerContext, TempdirContext
+
+ExecResult = collections.namedtuple("ExecResult", ["exit_code", "output"])
+
+
+class FakeContainer(object):
+    """Answers ``find`` like a container whose ``/build/out`` holds ``files``."""
+
+    def __init__(self, files):
+        self.files = files
+
+    def exec_run(self, command, user=None, demux=False):
+        assert demux, "stderr must not be mixed into the output"
+        base = command[1]
+
+        if not any(f.startswith(base + "/") for f in self.files):
+            return ExecResult(
+                1, (None, b"find: '%s': No such file or directory\n" % base.encode())
+            )
+
+        stdout = b"".join(
+            b"%s\n" % f.encode() for f in self.files if f.startswith(base + "/")
+        )
+        return ExecResult(0, (stdout, None))
+
+
+def test_container_find_output_files_missing_directory():
+    # Builds using a cached PGO profile don't export one.
+    context = ContainerContext(FakeContainer([]))
+
+    assert list(context.find_output_files("pgo-profile", "training.json")) == []
+
+
+def test_container_find_output_files():
+    context = ContainerContext(FakeContainer(["/build/out/pgo-profile/training.json"]))
+
+    assert list(context.find_output_files("pgo-profile", "training.json")) == [
+        "training.json"
+    ]
+
+
+def test_tempdir_find_output_files_empty_directory(tmp_path):
+    (tmp_path / "out" / "pgo-profile").mkdir(parents=True)
+    context = TempdirContext(tmp_path)
+
+    assert list(context.find_output_files("pgo-profile", "training.json")) == []